@@ -0,0 +1,226 @@
+import random
+import sys
+import time
+from collections import defaultdict
+
+from routing import RoutingEngine
+
+# Microbenchmark: confronta le vecchie implementazioni di L3Router.dijkstra/astar
+# (O(V^2), min() su un set) con RoutingEngine (heap binario) su griglie generate.
+#
+# Confronta anche le euristiche di A* (Manhattan sulle coordinate, landmark ALT senza coordinate)
+# con Dijkstra: nodi estratti dall'heap e tempo per query.
+#
+# Uso: python bench_routing.py [lato1 lato2 ...]   (default: 3 10 32 100 -> da 9 a 10000 switch)
+
+DEFAULT_SIDES = [3, 10, 32, 100]
+QUERIES = 20
+# Sulle griglie grandi le vecchie implementazioni impiegano secondi per query:
+# (numero minimo di switch, query eseguite con la vecchia versione)
+LEGACY_QUERY_LIMITS = [(5000, 1), (500, 5)]
+LANDMARKS = 4
+
+# --- VECCHIE IMPLEMENTAZIONI (copiate da controller.py) ---
+def legacy_manhattan_distance(coords, node, goal):
+  x1, y1 = coords[node]
+  x2, y2 = coords[goal]
+  return abs(x1 - x2) + abs(y1 - y2)
+
+def legacy_astar(switches, adjacency, link_weigths, coords, src, dst):
+  if src == dst:
+    return [src]
+
+  g_score = {d: float('inf') for d in switches}
+  g_score[src] = 0
+
+  f_score = {d: float('inf') for d in switches}
+  f_score[src] = legacy_manhattan_distance(coords, src, dst)
+
+  previous = {d: None for d in switches}
+
+  open_set = {src}
+
+  while open_set:
+    u = min(open_set, key=lambda x: f_score[x])
+
+    if u == dst: break
+
+    open_set.remove(u)
+
+    for v in adjacency[u]:
+      port_no = adjacency[u][v]
+      weight = link_weigths.get((u, port_no), 10)
+
+      tentative_g_score = g_score[u] + weight
+
+      if tentative_g_score < g_score[v]:
+        previous[v] = u
+        g_score[v] = tentative_g_score
+        f_score[v] = g_score[v] + legacy_manhattan_distance(coords, v, dst)
+        if v not in open_set:
+          open_set.add(v)
+
+  path = []
+  curr = dst
+  while curr is not None:
+    path.insert(0, curr)
+    curr = previous[curr]
+
+  return path if path and path[0] == src else None
+
+def legacy_dijkstra(switches, adjacency, link_weigths, src, dst):
+  if src == dst:
+    return [src]
+
+  distances = {d: float('inf') for d in switches}
+  previous = {d: None for d in switches}
+  distances[src] = 0
+  Q = set(switches)
+
+  while Q:
+    u = min(Q, key=lambda x: distances[x])
+    Q.remove(u)
+    if distances[u] == float('inf'): break
+    if u == dst: break
+
+    for v in adjacency[u]:
+      if v in Q:
+        port_no = adjacency[u][v]
+        weight = link_weigths.get((u, port_no), 10)
+
+        alt = distances[u] + weight
+
+        if alt < distances[v]:
+          distances[v] = alt
+          previous[v] = u
+
+  path = []
+  u = dst
+  while u is not None:
+    path.insert(0, u)
+    u = previous[u]
+  return path if path and path[0] == src else None
+
+# --- GENERAZIONE GRIGLIA ---
+def make_grid(side, seed=0):
+  """
+  Griglia side x side con dpid 1..side^2, porte numerate come le assegnerebbe OVS
+  e pesi 10 + traffico casuale (come in _port_stats_reply_handler)
+  """
+  rng = random.Random(seed)
+  switches = list(range(1, side*side + 1))
+  coords = {}
+  adjacency = defaultdict(lambda: defaultdict(lambda: None))
+  next_port = defaultdict(lambda: 1)
+
+  def dpid(r, c):
+    return r*side + c + 1
+
+  def connect(a, b):
+    adjacency[a][b] = next_port[a]
+    adjacency[b][a] = next_port[b]
+    next_port[a] += 1
+    next_port[b] += 1
+
+  for r in range(side):
+    for c in range(side):
+      coords[dpid(r, c)] = (2*c, 2*r)
+      if c + 1 < side: connect(dpid(r, c), dpid(r, c + 1))
+      if r + 1 < side: connect(dpid(r, c), dpid(r + 1, c))
+
+  link_weigths = {}
+  for u, peers in adjacency.items():
+    for port_no in peers.values():
+      link_weigths[(u, port_no)] = 10 + rng.random() * 5
+
+  return switches, adjacency, link_weigths, coords
+
+def path_cost(adjacency, link_weigths, path):
+  return sum(link_weigths.get((u, adjacency[u][v]), 10) for u, v in zip(path, path[1:]))
+
+def timed(fn, queries):
+  start = time.perf_counter()
+  results = [fn(src, dst) for src, dst in queries]
+  return (time.perf_counter() - start) / len(queries), results
+
+def run(side):
+  switches, adjacency, link_weigths, coords = make_grid(side)
+  n = len(switches)
+  rng = random.Random(side)
+  queries = [(rng.choice(switches), rng.choice(switches)) for _ in range(QUERIES)]
+  # La query peggiore: angolo opposto della griglia
+  queries[0] = (switches[0], switches[-1])
+  limit = next((q for min_n, q in LEGACY_QUERY_LIMITS if n >= min_n), QUERIES)
+  legacy_queries = queries[:limit]
+
+  engine = RoutingEngine(coords=coords)
+  start = time.perf_counter()
+  engine.rebuild(switches, adjacency, link_weigths)
+  rebuild_time = time.perf_counter() - start
+
+  rows = []
+  for name, old, new in [
+    ('dijkstra', lambda s, d: legacy_dijkstra(switches, adjacency, link_weigths, s, d), engine.dijkstra),
+    ('astar', lambda s, d: legacy_astar(switches, adjacency, link_weigths, coords, s, d), engine.astar),
+  ]:
+    old_time, old_paths = timed(old, legacy_queries)
+    new_time, new_paths = timed(new, queries)
+
+    for (s, d), p_old, p_new in zip(legacy_queries, old_paths, new_paths):
+      if p_old != p_new:
+        # A parita' di costo la vecchia A* sceglie in base all'ordine di iterazione del set
+        same_cost = abs(path_cost(adjacency, link_weigths, p_old) - path_cost(adjacency, link_weigths, p_new)) < 1e-9
+        if name == 'dijkstra' or not same_cost:
+          raise AssertionError(f'{name}: path diverso per {s}->{d}: {p_old} vs {p_new}')
+
+    rows.append((name, old_time, new_time))
+
+  print(f'Switches: {n:>6} | rebuild: {rebuild_time*1e3:8.2f} ms')
+  for name, old_time, new_time in rows:
+    print(f'  {name:<8} old: {old_time*1e3:10.3f} ms/query  new: {new_time*1e3:8.3f} ms/query  speedup: x{old_time/new_time:.1f}')
+
+def run_heuristics(side):
+  switches, adjacency, link_weigths, coords = make_grid(side)
+  rng = random.Random(side)
+  queries = [(rng.choice(switches), rng.choice(switches)) for _ in range(QUERIES)]
+  queries[0] = (switches[0], switches[-1])
+
+  manhattan = RoutingEngine(coords=coords)
+  alt = RoutingEngine(landmarks=LANDMARKS)
+  manhattan.rebuild(switches, adjacency, link_weigths)
+  alt.rebuild(switches, adjacency, link_weigths)
+
+  # Le distanze dai landmark si ricalcolano una volta per giro di statistiche: costo misurato a parte
+  start = time.perf_counter()
+  alt.update_landmarks()
+  landmark_time = time.perf_counter() - start
+
+  rows = []
+  for name, fn, engine in [
+    ('dijkstra', manhattan.dijkstra, manhattan),
+    ('manhattan', manhattan.astar, manhattan),
+    (f'alt({LANDMARKS})', alt.astar, alt),
+  ]:
+    expanded = 0
+    start = time.perf_counter()
+    paths = []
+    for s, d in queries:
+      paths.append(fn(s, d))
+      expanded += engine.expanded
+    rows.append((name, (time.perf_counter() - start) / len(queries), expanded / len(queries), paths))
+
+  reference = rows[0][3]
+  for name, _, _, paths in rows[1:]:
+    for (s, d), p_ref, p in zip(queries, reference, paths):
+      if abs(path_cost(adjacency, link_weigths, p_ref) - path_cost(adjacency, link_weigths, p)) > 1e-9:
+        raise AssertionError(f'{name}: percorso non minimo per {s}->{d}: {p} vs {p_ref}')
+
+  print(f'  heuristics (landmark update: {landmark_time*1e3:.2f} ms)')
+  for name, query_time, expanded, _ in rows:
+    print(f'    {name:<10} {query_time*1e3:8.3f} ms/query  {expanded:8.1f} nodi estratti/query')
+
+if __name__ == '__main__':
+  sides = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIDES
+  for side in sides:
+    run(side)
+    run_heuristics(side)
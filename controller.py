@@ -3,40 +3,161 @@ from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
-from ryu.lib.packet import packet, ethernet, ether_types, arp, ipv4
-from ryu.topology.api import get_switch, get_link
+from ryu.lib.packet import packet, ethernet, ether_types, arp
 from ryu.topology import event
-from collections import defaultdict
+from collections import defaultdict, deque
 from ryu.lib import hub
-import json
+from routing import RoutingEngine, RoutingTable, RouteCache
+from packet_parser import parse_packet, parse_packet_full
+from link_cost import make_estimator, BASE_COST
+from telemetry import TelemetryWriter
+from path_workers import PathWorkerPool
+from stats_poller import StatsPoller
+from flow_table import ShadowFlowTable
+from metrics import Metrics, MetricsController, METRICS_INSTANCE
+from topology_spec import TOPOLOGY_PATH, load_topology, heuristic_coords
+from ryu.app.wsgi import WSGIApplication
 import sys
 import signal
+import time
 
 # --- CONFIGURAZIONE ---
 ROUTER_MAC = '00:00:00:00:fe:fe'
 ALGORITHM = 'astar'
 update_time_threshold = 3
 
-SWITCH_COORDS = {
-  1: (6, 4),  # sw1
-  2: (8, 4),  # sw2
-  3: (10, 4), # sw3
-  4: (6, 6),  # sw4
-  5: (8, 6),  # sw5
-  6: (10, 6), # sw6
-  7: (6, 8),  # sw7
-  8: (8, 8),  # sw8
-  9: (10, 8)  # sw9
-}
+# Stimatore del costo dei link (vedi link_cost.py):
+#   'bytes' -> 10 + MiB (tx + rx) trasferiti tra due risposte (versione originale)
+#   'rate'  -> rate tx sui timestamp dello switch, utilizzo rispetto alla capacita',
+#              EWMA e isteresi sul peso pubblicato
+# In LINK_COST_PARAMS per 'rate' si puo' indicare la capacita' dei singoli link con
+# port_capacity={(dpid, porta): bps}
+LINK_COST_ESTIMATOR = 'rate'
+LINK_COST_PARAMS = {'alpha': 0.3, 'hysteresis': 0.1, 'capacity_bps': 1e9}
+
+# Snapshot dei pesi scritti in TELEMETRY_PATH (un record JSON per ciclo), ruotato
+# oltre TELEMETRY_MAX_BYTES; in memoria restano solo gli ultimi TELEMETRY_RING_SIZE
+TELEMETRY_PATH = f'{ALGORITHM}_weighted_paths.jsonl'
+TELEMETRY_MAX_BYTES = 10*1024*1024
+TELEMETRY_BACKUPS = 5
+TELEMETRY_RING_SIZE = 100
+
+# Se impostato, packet-in e risposte alle port stats vengono registrati in questo file
+# (JSON Lines, ruotato come la telemetria) per essere riprodotti senza Mininet con replay.py
+TRACE_PATH = None
+
+# Gli eventi di topologia (switch/porte/link) vengono accumulati e applicati insieme dopo
+# TOPOLOGY_DEBOUNCE secondi senza nuovi eventi, al massimo TOPOLOGY_MAX_DELAY dopo il primo.
+# Con TOPOLOGY_PRINT la topologia viene stampata dopo ogni aggiornamento
+TOPOLOGY_DEBOUNCE = 0.2
+TOPOLOGY_MAX_DELAY = 1
+TOPOLOGY_PRINT = True
+
+# Cache dei percorsi (src, dst): numero massimo di entry e variazione relativa
+# del peso di un link oltre la quale i percorsi che lo attraversano vengono ricalcolati
+ROUTE_CACHE_SIZE = 1024
+ROUTE_CACHE_TOLERANCE = 0.1
+
+# Se True la tabella dei prossimi hop per ogni coppia di switch viene ricalcolata
+# (in modo incrementale) in monitor_stats e il packet-in fa solo lookup.
+# Gli alberi sono calcolati con Dijkstra indipendentemente da ALGORITHM
+PRECOMPUTED_ROUTES = False
+
+# Se True, appena un host entra in arp_table viene installato su ogni switch il prossimo hop
+# verso di lui (albero dei cammini minimi verso il suo switch), con regole permanenti
+# aggiornate solo dove cambiano quando cambiano pesi o topologia
+PROACTIVE_ROUTING = False
+
+# Se True il traffico verso uno switch viene distribuito su piu' percorsi quasi equivalenti:
+# ogni switch usa i prossimi hop con costo entro MULTIPATH_SLACK (relativo) dal minimo, al massimo
+# MULTIPATH_MAX_PATHS, tramite un gruppo OpenFlow select. I pesi dei bucket seguono link_weigths
+# e vengono aggiornati in monitor_stats. Non si applica con PROACTIVE_ROUTING
+MULTIPATH_ROUTING = False
+MULTIPATH_SLACK = 0.2
+MULTIPATH_MAX_PATHS = 4
+
+# Se True i percorsi che mancano in cache e il refresh di PRECOMPUTED_ROUTES vengono calcolati
+# su thread nativi (path_workers.py) e l'hub resta libero per packet-in, echo e statistiche:
+# il pacchetto riparte quando il percorso e' pronto. Al massimo PATH_WORKERS_MAX_IN_FLIGHT
+# calcoli contemporanei; le richieste uguali ancora in corso vengono accorpate
+PATH_WORKERS = False
+PATH_WORKERS_MAX_IN_FLIGHT = 4
+
+# Timeout delle regole installate in modo reattivo
+FLOW_IDLE_TIMEOUT = 5
+FLOW_HARD_TIMEOUT = 15
+
+# Se True il controller tiene una copia delle regole installate in modo reattivo su ogni switch
+# (azioni, cookie e hard timeout; le regole chiedono il FlowRemoved con OFPFF_SEND_FLOW_REM) e non
+# reinvia FlowMod identiche a regole ancora installate. L'idle timeout diventa per destinazione:
+# parte da FLOW_IDLE_TIMEOUT, raddoppia quando le regole vengono reinstallate subito dopo essere
+# scadute per inattivita' e si dimezza quando restano inutilizzate a lungo, tra
+# FLOW_IDLE_TIMEOUT_MIN e FLOW_IDLE_TIMEOUT_MAX (l'hard timeout, o 60 secondi se le regole non ne hanno)
+SHADOW_FLOW_TABLE = False
+FLOW_IDLE_TIMEOUT_MIN = 2
+FLOW_IDLE_TIMEOUT_MAX = FLOW_HARD_TIMEOUT or 60
+
+# Se True dopo ogni aggiornamento dei pesi i flussi installati in modo reattivo il cui percorso
+# costa oltre REROUTE_THRESHOLD (relativo) piu' del percorso migliore vengono spostati su quest'ultimo
+# (prima il nuovo tratto, poi, confermato dalle barrier, gli switch gia' sul vecchio percorso),
+# al massimo REROUTE_MAX_PER_CYCLE flussi per ciclo. Con il rerouting attivo FLOW_HARD_TIMEOUT
+# non serve piu' a far ripartire i flussi sul percorso migliore e puo' essere alzato
+CONGESTION_REROUTE = False
+REROUTE_THRESHOLD = 0.3
+REROUTE_MAX_PER_CYCLE = 4
+
+# Se True il primo packet-in installa anche il percorso di ritorno verso il mittente.
+# Il pacchetto viene rilasciato solo dopo le risposte alle barrier (o dopo BARRIER_TIMEOUT secondi)
+BIDIRECTIONAL_INSTALL = True
+BARRIER_TIMEOUT = 1
+
+# Se True i packet-in vengono classificati leggendo direttamente i byte del frame
+# (packet_parser.parse_packet); il parser completo di Ryu resta come fallback
+FAST_PACKET_PARSER = True
+
+# Pacchetti verso destinazioni non ancora in arp_table: restano in coda (al massimo ARP_PENDING_MAX
+# per destinazione, scartati dopo ARP_PENDING_TIMEOUT secondi) e il probe viene ripetuto
+# al massimo ogni ARP_PROBE_INTERVAL secondi
+ARP_PENDING_MAX = 64
+ARP_PENDING_TIMEOUT = 3
+ARP_PROBE_INTERVAL = 1
+
+# Se True le OFPPortStats non vengono chieste a tutti gli switch insieme ogni update_time_threshold
+# secondi: ogni switch ha una fase diversa e ogni porta un intervallo tra POLL_MIN_INTERVAL e
+# POLL_MAX_INTERVAL, piu' corto quando il peso cambia di oltre POLL_CHANGE_THRESHOLD e al massimo
+# POLL_BUSY_MAX_INTERVAL per le porte con traffico (peso oltre POLL_BUSY_WEIGHT). Lo scheduler
+# controlla le scadenze ogni POLL_TICK secondi. Richieste e freschezza dei pesi per switch sono
+# contate in entrambe le modalita' (log di debug e /metrics)
+ADAPTIVE_POLLING = False
+POLL_MIN_INTERVAL = 0.5
+POLL_MAX_INTERVAL = 10
+POLL_BUSY_MAX_INTERVAL = update_time_threshold
+POLL_BUSY_WEIGHT = BASE_COST + 5
+POLL_CHANGE_THRESHOLD = 0.1
+POLL_TICK = 0.1
+
+# Numero di switch landmark per l'euristica di A* (distanze ricalcolate una volta per giro di statistiche
+# in monitor_stats e a ogni cambio di topologia); con 0 l'euristica usa solo le coordinate degli
+# switch in TOPOLOGY_PATH (topology_spec.py)
+ASTAR_LANDMARKS = 4
+
+# Se True il controller misura le latenze di packet-in, calcolo dei percorsi, installazione delle
+# regole, risoluzione ARP e round trip delle statistiche, esposte con i contatori in formato
+# Prometheus su GET /metrics (server WSGI di Ryu, --wsapi-port, default 8080).
+# Una risposta alle statistiche e' in ritardo se arriva dopo STATS_LATE_THRESHOLD secondi
+METRICS_ENABLED = False
+STATS_LATE_THRESHOLD = 1
+
 
 class L3Router(app_manager.RyuApp):
   OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+  _CONTEXTS = {'wsgi': WSGIApplication} if METRICS_ENABLED else {}
 
   def __init__(self, *args, **kwargs):
     super(L3Router, self).__init__(*args, **kwargs)
     self.topology_api_app = self
 
-    self.port_stats = {}
+    self.link_cost = make_estimator(LINK_COST_ESTIMATOR, **LINK_COST_PARAMS)
     self.link_weigths = {}
     self.monitor_thread = hub.spawn(self.monitor_stats)
 
@@ -44,89 +165,233 @@ class L3Router(app_manager.RyuApp):
     self.adjacency = defaultdict(lambda: defaultdict(lambda: None))
     self.switches = []
     self.datapaths = {}
-    self.history = []
+    self.switch_ports = {} # dpid -> {porte fisiche}
+
+    self.pending_topology_events = []
+    self.topology_first_event = 0
+    self.topology_deadline = 0
+    self.topology_timer = None
+    # Notificati a ogni cambio di topologia con (link aggiunti, link rimossi), link come (dpid, porta, dpid vicino)
+    self.topology_listeners = []
+    self.telemetry = TelemetryWriter(
+      TELEMETRY_PATH,
+      max_bytes=TELEMETRY_MAX_BYTES,
+      backup_count=TELEMETRY_BACKUPS,
+      ring_size=TELEMETRY_RING_SIZE
+    )
+    self.trace = None
+    if TRACE_PATH:
+      self.trace = TelemetryWriter(TRACE_PATH, max_bytes=TELEMETRY_MAX_BYTES, backup_count=TELEMETRY_BACKUPS, ring_size=0)
     self.timestamp = 0
     self.last_path = None
+    # Coordinate scalate in modo che la distanza tra due switch vicini non superi il costo minimo di un link
+    self.topology = load_topology(TOPOLOGY_PATH)
+    self.plot_offset = len(self.topology['hosts'])
+    self.routing_engine = RoutingEngine(coords=heuristic_coords(self.topology, BASE_COST), landmarks=ASTAR_LANDMARKS)
+    self.route_cache = RouteCache(max_size=ROUTE_CACHE_SIZE, tolerance=ROUTE_CACHE_TOLERANCE)
+    self.topology_listeners.append(self.route_cache.links_changed)
+    self.routing_table = RoutingTable(self.routing_engine)
+    self.routing_table_refreshing = False
+    self.path_workers = PathWorkerPool(self.routing_engine, ALGORITHM, max_in_flight=PATH_WORKERS_MAX_IN_FLIGHT)
+    self.proactive_flows = {} # ip -> {dpid: regola installata}
+    self.multipath_dags = {}   # dpid destinazione -> (timbro dei pesi, {dpid: prossimi hop})
+    self.multipath_groups = {} # (dpid, dpid destinazione) -> bucket installati ((porta, peso), ...)
+
+    self.pending_installs = {} # (dpid ingresso, ip_dst) -> installazione in attesa delle barrier
+    self.pending_barriers = {} # (dpid, xid) -> installazione in attesa
+    self.recent_installs = {}  # (dpid ingresso, ip_dst) -> istante dell'installazione
+    self.active_flows = {}     # (dpid ingresso, ip_dst) -> percorso installato (vedi register_flow)
+    self.flow_table = ShadowFlowTable(
+      idle_timeout=FLOW_IDLE_TIMEOUT,
+      hard_timeout=FLOW_HARD_TIMEOUT,
+      min_idle_timeout=FLOW_IDLE_TIMEOUT_MIN,
+      max_idle_timeout=FLOW_IDLE_TIMEOUT_MAX
+    )
+    self.install_stats = {
+      'installs': 0,
+      'reverse_installs': 0,
+      'flow_mods': 0,
+      'held_packets': 0,          # packet-in trattenuti mentre le regole erano in installazione
+      'duplicate_packet_ins': 0,  # packet-in per una coppia con regole ancora valide
+      'barrier_timeouts': 0,
+      'group_mods': 0,
+      'reroutes': 0
+    }
+
+    self.port_peers = {}   # (dpid, porta) -> ('switch', dpid vicino) oppure ('host', ip)
+    self.edge_ports = {}   # dpid -> {porte non collegate ad altri switch}
+    self.pending_arp = {}  # ip -> pacchetti in attesa della risposta ARP
+    self.arp_stats = {'probes': 0, 'queued': 0, 'released': 0, 'dropped': 0}
+
+    self.metrics = Metrics()
+    self.stats_requests = {} # (dpid, porta richiesta) -> (xid, istante) delle richieste di statistiche senza risposta
+    self.stats_poller = StatsPoller(
+      base_interval=update_time_threshold,
+      min_interval=POLL_MIN_INTERVAL,
+      max_interval=POLL_MAX_INTERVAL,
+      busy_max_interval=POLL_BUSY_MAX_INTERVAL,
+      busy_weight=POLL_BUSY_WEIGHT,
+      change_threshold=POLL_CHANGE_THRESHOLD
+    )
+    if ADAPTIVE_POLLING:
+      self.poll_thread = hub.spawn(self.poll_stats)
+    for name, fn in [
+      ('install', lambda: self.install_stats),
+      ('arp', lambda: self.arp_stats),
+      ('route_cache', self.route_cache.stats),
+      ('path_workers', self.path_workers.stats),
+      ('polling', self.stats_poller.stats),
+      ('flow_table', self.flow_table.stats)
+    ]:
+      self.metrics.collect(name, fn)
+    if 'wsgi' in kwargs:
+      kwargs['wsgi'].register(MetricsController, {METRICS_INSTANCE: self.metrics})
+
     signal.signal(signal.SIGINT, self.save)
   
   def save(self, sig, frame):
     self.logger.info("Salvataggio dati")
-    with open(f'{ALGORITHM}_weighted_paths.json', 'w') as file:
-      json.dump(self.history, file, indent=4)
+    self.telemetry.close()
+    if self.trace is not None:
+      self.trace.close()
     self.logger.info("Dati salvati. Chiusura in corso.")
     sys.exit(0)
 
   def monitor_stats(self):
 
     while True:
-      for datapath in self.datapaths.values():
-        self.get_stats(datapath)
+      if not ADAPTIVE_POLLING:
+        for datapath in self.datapaths.values():
+          self.get_stats(datapath)
       hub.sleep(1)
 
+      # Pesi del giro di statistiche applicati: tabelle dei landmark aggiornate una volta sola
+      if ALGORITHM == 'astar':
+        self.routing_engine.refresh_landmarks()
+      if PRECOMPUTED_ROUTES:
+        self.refresh_routing_table()
+      if PROACTIVE_ROUTING:
+        self.refresh_proactive_flows()
+      if MULTIPATH_ROUTING:
+        self.refresh_multipath_groups()
+      if CONGESTION_REROUTE:
+        self.reroute_congested_flows()
+
       if self.link_weigths != {}:
         formatted_weights = []
         for (dpid, port_no), weight in self.link_weigths.items():
-          target_node = None
-
-          if dpid in self.adjacency:
-            for peer_dpid, p_no in self.adjacency[dpid].items():
-              if p_no == port_no:
-                target_node = peer_dpid + 5
-                break
-          if target_node is None:
-            if dpid == 1 and port_no == 3: target_node = 1
-            if dpid == 1 and port_no == 4: target_node = 2
-            if dpid == 7 and port_no == 3: target_node = 3
-            if dpid == 3 and port_no == 3: target_node = 4
-            if dpid == 9 and port_no == 3: target_node = 5
+          target_node = self.plot_node(self.port_peers.get((dpid, port_no)))
         
           if target_node:
             formatted_weights.append({
-              'source': dpid + 5,
+              'source': dpid + self.plot_offset,
               'dest': target_node,
               'weight': weight
             })
 
-        self.history.append({
+        self.telemetry.write({
           "timestamp": self.timestamp,
           "algorithm": ALGORITHM,
+          "estimator": LINK_COST_ESTIMATOR,
           "weights": formatted_weights,
-          "last_path": [n+5 for n in self.last_path] if self.last_path else None
+          "last_path": [n + self.plot_offset for n in self.last_path] if self.last_path else None
         })
       
+      self.logger.debug('Route cache: %s', self.route_cache.stats())
+      if PATH_WORKERS:
+        self.logger.debug('Path workers: %s', self.path_workers.stats())
+      self.logger.debug('Installazioni: %s', self.install_stats)
+      self.prune_recent_installs()
+      self.expire_pending_arp()
+      self.logger.debug('ARP: %s', self.arp_stats)
+      self.report_polling()
       hub.sleep(update_time_threshold - 1)
       self.timestamp += update_time_threshold
 
-  def get_stats(self, datapath):
+  def poll_stats(self):
+    # Con ADAPTIVE_POLLING: richieste sfasate decise da stats_poller
+    while True:
+      for dpid, port_no in self.stats_poller.due(self.switch_ports, time.monotonic()):
+        datapath = self.datapaths.get(dpid)
+        if datapath is not None:
+          self.get_stats(datapath, port_no)
+      hub.sleep(POLL_TICK)
+
+  def report_polling(self):
+    report = self.stats_poller.report(self.switch_ports, time.monotonic())
+    for dpid, values in report.items():
+      self.logger.debug('Polling switch %016x: %s', dpid, values)
+      if METRICS_ENABLED:
+        for name in ('requests_per_second', 'mean_interval', 'mean_age', 'max_age'):
+          if values[name] is not None:
+            self.metrics.set(f'polling_{name}', values[name], dpid=dpid)
+
+  def get_stats(self, datapath, port_no=None):
+    """
+    OFPPortStatsRequest per una porta dello switch, o per tutte se port_no e' None
+    """
     self.logger.debug('Invio richiesta delle statistiche allo switch: %016x', datapath.id)
     ofproto = datapath.ofproto
     parser = datapath.ofproto_parser
+    port_no = ofproto.OFPP_ANY if port_no is None else port_no
 
-    request = parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY)
+    request = parser.OFPPortStatsRequest(datapath, 0, port_no)
     datapath.send_msg(request)
+    now = time.monotonic()
+    self.stats_poller.sent(datapath.id, now)
+
+    if METRICS_ENABLED:
+      key = (datapath.id, port_no)
+      if key in self.stats_requests:
+        self.metrics.inc('stats_missing_replies_total')
+      self.stats_requests[key] = (request.xid, now)
+
+  def stats_request_key(self, dpid, xid, body):
+    # Richiesta a cui risponde il messaggio: per una porta sola la risposta contiene solo quella porta
+    candidates = [(dpid, ofproto_v1_3.OFPP_ANY)]
+    if len(body) == 1:
+      candidates.append((dpid, body[0].port_no))
+    for key in candidates:
+      entry = self.stats_requests.get(key)
+      if entry is not None and entry[0] == xid:
+        return key
+    return None
 
   @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
   def _port_stats_reply_handler(self, ev):
     body = ev.msg.body
     dpid = ev.msg.datapath.id
 
+    if self.trace is not None:
+      self.trace.write({
+        'type': 'port_stats',
+        'dpid': dpid,
+        'stats': [[stat.port_no, stat.rx_bytes, stat.tx_bytes, stat.duration_sec, stat.duration_nsec] for stat in body]
+      })
+
+    now = time.monotonic()
+    self.stats_poller.replied(dpid, len(body))
+    if METRICS_ENABLED:
+      key = self.stats_request_key(dpid, ev.msg.xid, body)
+      if key is not None:
+        rtt = now - self.stats_requests.pop(key)[1]
+        self.metrics.observe('stats_rtt_seconds', rtt)
+        if rtt > STATS_LATE_THRESHOLD:
+          self.metrics.inc('stats_late_replies_total')
+
     for stat in body:
       port_no = stat.port_no
       if port_no > ofproto_v1_3.OFPP_MAX:
         continue
 
-      current_bytes = stat.tx_bytes + stat.rx_bytes
       key = (dpid, port_no)
-
-      prev_bytes = self.port_stats.get(key, current_bytes)
-      delta_bytes = current_bytes - prev_bytes
-
-      base_cost = 10
-      traffic_cost = delta_bytes / (1024*1024)
-      new_weight = base_cost + traffic_cost
+      new_weight = self.link_cost.update(key, stat)
+      self.stats_poller.observe(dpid, port_no, new_weight, now)
+      if new_weight is None: continue
 
       self.link_weigths[key] = new_weight
-      self.port_stats[key] = current_bytes
+      self.routing_engine.set_weight(dpid, port_no, new_weight)
+      self.route_cache.update_weight(dpid, port_no, new_weight)
 
       #self.logger.info(f"SW {dpid} Port {port_no} -> Weight: {new_weight:.2f}")
 
@@ -165,114 +430,615 @@ class L3Router(app_manager.RyuApp):
     event.EventLinkAdd, event.EventLinkDelete
   ])
   def update_topology(self, ev):
-    # Aggiorna lista switch
-    switch_list = get_switch(self.topology_api_app, None)
-    self.switches = [sw.dp.id for sw in switch_list]
-    self.datapaths = {sw.dp.id: sw.dp for sw in switch_list}
-    
-    # Aggiorna adiacenze
-    link_list = get_link(self.topology_api_app, None)
-    
-    # Salviamo la vecchia topologia per vedere se è cambiato qualcosa prima di stampare (per evitare spam inutile)
-    # Ma per sicurezza ristampiamo sempre quando c'è un evento
-    self.adjacency.clear()
-    for link in link_list:
+    # Gli eventi vengono accumulati e applicati tutti insieme quando non ne arrivano
+    # altri per TOPOLOGY_DEBOUNCE secondi (al massimo dopo TOPOLOGY_MAX_DELAY dal primo)
+    now = time.monotonic()
+    if not self.pending_topology_events:
+      self.topology_first_event = now
+    self.pending_topology_events.append(ev)
+    self.topology_deadline = min(now + TOPOLOGY_DEBOUNCE, self.topology_first_event + TOPOLOGY_MAX_DELAY)
+
+    if self.topology_timer is None:
+      self.topology_timer = hub.spawn(self._topology_debounce)
+
+  def _topology_debounce(self):
+    while True:
+      delay = self.topology_deadline - time.monotonic()
+      if delay <= 0: break
+      hub.sleep(delay)
+    self.topology_timer = None
+    self.commit_topology()
+
+  def apply_topology_event(self, ev):
+    if isinstance(ev, event.EventSwitchEnter):
+      dp = ev.switch.dp
+      if dp.id not in self.datapaths:
+        self.switches.append(dp.id)
+      self.datapaths[dp.id] = dp
+      self.switch_ports[dp.id] = {port.port_no for port in ev.switch.ports if port.port_no <= ofproto_v1_3.OFPP_MAX}
+
+    elif isinstance(ev, event.EventSwitchLeave):
+      dpid = ev.switch.dp.id
+      if dpid in self.datapaths:
+        self.switches.remove(dpid)
+        del self.datapaths[dpid]
+      self.switch_ports.pop(dpid, None)
+      for peer_dpid in list(self.adjacency.get(dpid, {})):
+        self.adjacency[peer_dpid].pop(dpid, None)
+      self.adjacency.pop(dpid, None)
+
+    elif isinstance(ev, event.EventPortAdd):
+      if ev.port.port_no <= ofproto_v1_3.OFPP_MAX:
+        self.switch_ports.setdefault(ev.port.dpid, set()).add(ev.port.port_no)
+
+    elif isinstance(ev, event.EventPortDelete):
+      self.switch_ports.get(ev.port.dpid, set()).discard(ev.port.port_no)
+      peers = self.adjacency.get(ev.port.dpid, {})
+      for peer_dpid in [peer for peer, port_no in peers.items() if port_no == ev.port.port_no]:
+        del peers[peer_dpid]
+        self.adjacency[peer_dpid].pop(ev.port.dpid, None)
+
+    elif isinstance(ev, event.EventLinkAdd):
+      link = ev.link
       self.adjacency[link.src.dpid][link.dst.dpid] = link.src.port_no
       self.adjacency[link.dst.dpid][link.src.dpid] = link.dst.port_no
-        
-    # CHIAMA LA FUNZIONE DI STAMPA
-    self.print_current_topology()
+
+    elif isinstance(ev, event.EventLinkDelete):
+      link = ev.link
+      if self.adjacency.get(link.src.dpid, {}).get(link.dst.dpid) == link.src.port_no:
+        del self.adjacency[link.src.dpid][link.dst.dpid]
+      if self.adjacency.get(link.dst.dpid, {}).get(link.src.dpid) == link.dst.port_no:
+        del self.adjacency[link.dst.dpid][link.src.dpid]
+
+  def commit_topology(self):
+    events = self.pending_topology_events
+    self.pending_topology_events = []
+    if not events: return
+
+    old_links = self.get_links()
+    old_switches = set(self.switches)
+    for ev in events:
+      self.apply_topology_event(ev)
+    new_links = self.get_links()
+
+    added_links = new_links - old_links
+    removed_links = old_links - new_links
+
+    self.update_port_peers()
+    self.update_edge_ports()
+
+    if added_links or removed_links or set(self.switches) != old_switches:
+      self.routing_engine.rebuild(self.switches, self.adjacency, self.link_weigths)
+      if ALGORITHM == 'astar':
+        self.routing_engine.refresh_landmarks()
+
+      if PRECOMPUTED_ROUTES:
+        self.refresh_routing_table()
+      if PROACTIVE_ROUTING:
+        self.refresh_proactive_flows()
+      if MULTIPATH_ROUTING:
+        self.refresh_multipath_groups()
+
+      for listener in self.topology_listeners:
+        listener(added_links, removed_links)
+
+    self.logger.debug('Topologia: %d eventi applicati, %d link aggiunti, %d rimossi', len(events), len(added_links), len(removed_links))
+    if TOPOLOGY_PRINT:
+      self.print_current_topology()
+
+  def get_links(self):
+    return {
+      (dpid, port_no, peer_dpid)
+      for dpid, peers in self.adjacency.items()
+      for peer_dpid, port_no in peers.items() if port_no is not None
+    }
+
+  def refresh_routing_table(self):
+    if not PATH_WORKERS:
+      self.routing_table_refreshed(self.routing_table.refresh())
+    elif not self.routing_table_refreshing:
+      self.routing_table_refreshing = True
+      self.path_workers.submit(self.routing_table.refresh, (), self.routing_table_refreshed)
+
+  def routing_table_refreshed(self, stats):
+    self.routing_table_refreshing = False
+    if stats is None: return
+    self.logger.info(
+      'Routing table refresh: %d/%d alberi ricalcolati (%d link cambiati) in %.2f ms',
+      stats['trees_recomputed'], stats['trees'], stats['changed_links'], stats['duration_ms']
+    )
 
   def get_path(self, src, dst):
+    if PRECOMPUTED_ROUTES and self.routing_table.is_current():
+      path = self.routing_table.path(src, dst)
+      if path and len(path) > 1:
+        self.last_path = path
+      return path
+
+    if src != dst:
+      path = self.route_cache.get(src, dst)
+      if path is not None:
+        self.last_path = path
+        return path
+
+    if METRICS_ENABLED:
+      start = time.perf_counter()
+
     if ALGORITHM == 'dijkstra':
-      return self.dijkstra(src, dst)
+      path = self.dijkstra(src, dst)
     elif ALGORITHM == 'astar': 
-      return self.astar(src, dst)
+      path = self.astar(src, dst)
     else: 
       raise RuntimeError('Unknown routing algorithm "{}"'.format(ALGORITHM))
 
-  def manhattan_distance(self, node, goal):
-    x1, y1 = SWITCH_COORDS[node]
-    x2, y2 = SWITCH_COORDS[goal]
-    return abs(x1 - x2) + abs(y1 - y2)
+    if METRICS_ENABLED:
+      self.metrics.observe('path_compute_seconds', time.perf_counter() - start, algorithm=ALGORITHM)
 
-  def astar(self, src, dst):
-    if src == dst:
-      return [src]
+    self.cache_path(src, dst, path)
+    return path
 
-    g_score = {d: float('inf') for d in self.switches}
-    g_score[src] = 0
+  def cache_path(self, src, dst, path):
+    if path and len(path) > 1:
+      links = {}
+      for u, v in zip(path, path[1:]):
+        port_no = self.adjacency[u][v]
+        links[(u, port_no)] = self.link_weigths.get((u, port_no), 10)
+      self.route_cache.put(src, dst, path, links)
 
-    f_score = {d: float('inf') for d in self.switches}
-    f_score[src] = self.manhattan_distance(src, dst)
+  def has_path(self, src, dst):
+    # Percorso ottenibile senza calcolo (cache o tabella precalcolata)
+    return src == dst or (src, dst) in self.route_cache or (PRECOMPUTED_ROUTES and self.routing_table.is_current())
 
-    previous = {d: None for d in self.switches}
-    
-    open_set = {src}
+  def request_paths(self, msg, pkt, pairs):
+    """
+    Chiede ai worker i percorsi non ancora disponibili tra le coppie (src, dst) e ripete
+    route_ip_packet quando sono tutti pronti. Restituisce False se non c'era niente da calcolare
+    """
+    missing = [(src, dst) for src, dst in pairs if not self.has_path(src, dst)]
+    if not missing: return False
 
-    while open_set:
-      u = min(open_set, key=lambda x: f_score[x])
-      
-      if u == dst: break
-      
-      open_set.remove(u)
+    remaining = [len(missing)]
+    start = time.perf_counter()
+    def on_path(src, dst, path):
+      if METRICS_ENABLED:
+        self.metrics.observe('path_worker_seconds', time.perf_counter() - start)
+      # Il grafo puo' essere cambiato durante il calcolo: il percorso deve esistere ancora
+      if path and all(self.adjacency.get(u, {}).get(v) is not None for u, v in zip(path, path[1:])):
+        self.cache_path(src, dst, path)
+      remaining[0] -= 1
+      if remaining[0] == 0:
+        self.route_ip_packet(msg, pkt, computed=True)
 
-      for v in self.adjacency[u]:
-        port_no = self.adjacency[u][v]
-        weight = self.link_weigths.get((u, port_no), 10)
-        
-        tentative_g_score = g_score[u] + weight
-
-        if tentative_g_score < g_score[v]:
-          previous[v] = u
-          g_score[v] = tentative_g_score
-          f_score[v] = g_score[v] + self.manhattan_distance(v, dst)
-          if v not in open_set:
-            open_set.add(v)
-
-    path = []
-    curr = dst
-    while curr is not None:
-      path.insert(0, curr)
-      curr = previous[curr]
-    
-    self.last_path = path if path and path[0] == src else None
+    for src, dst in missing:
+      self.path_workers.request_path(src, dst, lambda path, src=src, dst=dst: on_path(src, dst, path))
+    return True
+
+  def astar(self, src, dst):
+    if src == dst:
+      return [src]
+
+    self.last_path = self.routing_engine.astar(src, dst)
     return self.last_path
 
   def dijkstra(self, src, dst):
     if src == dst:
       return [src]
-          
-    distances = {d: float('inf') for d in self.switches}
-    previous = {d: None for d in self.switches}
-    distances[src] = 0
-    Q = set(self.switches)
-
-    while Q:
-      u = min(Q, key=lambda x: distances[x])
-      Q.remove(u)
-      if distances[u] == float('inf'): break
-      if u == dst: break
-
-      for v in self.adjacency[u]:
-        if v in Q:
-          port_no = self.adjacency[u][v]
-          weight = self.link_weigths.get((u, port_no), 10)
-
-          alt = distances[u] + weight
-
-          if alt < distances[v]:
-            distances[v] = alt
-            previous[v] = u
-
-    path = []
-    u = dst
-    while u is not None:
-      path.insert(0, u)
-      u = previous[u]
-    self.last_path = path if path and path[0] == src else None
+
+    self.last_path = self.routing_engine.dijkstra(src, dst)
     return self.last_path
 
+  # --- ROUTING PROATTIVO ---
+  def learn_host(self, ip, dpid, port_no, mac):
+    entry = (dpid, port_no, mac)
+    if self.arp_table.get(ip) == entry: return
+    # Un pacchetto arrivato da un link tra switch non dice dove si trova l'host
+    if self.is_switch_port(dpid, port_no): return
+
+    old_entry = self.arp_table.get(ip)
+    if old_entry is not None and self.port_peers.get(old_entry[:2]) == ('host', ip):
+      del self.port_peers[old_entry[:2]]
+    self.arp_table[ip] = entry
+    self.port_peers[(dpid, port_no)] = ('host', ip)
+
+    if PROACTIVE_ROUTING:
+      self.install_sink_tree(ip)
+    if ip in self.pending_arp:
+      self.release_arp_queue(ip)
+
+  def get_sink_tree(self, dst_dpid):
+    """
+    Albero dei cammini minimi verso dst_dpid come {dpid: (dpid prossimo hop, distanza)}
+    """
+    engine = self.routing_engine
+    t = engine.index.get(dst_dpid)
+    if t is None: return {}
+
+    if PRECOMPUTED_ROUTES and self.routing_table.is_current():
+      next_hop, dist = self.routing_table.trees[t]
+    else:
+      next_hop, dist = engine.sink_tree(t)
+
+    return {engine.nodes[i]: (engine.nodes[hop], dist[i]) for i, hop in enumerate(next_hop) if hop != -1}
+
+  def sink_tree_actions(self, parser, rule):
+    dec_ttl = parser.OFPActionDecNwTtl()
+    if rule[0] == 'egress':
+      _, dst_port, dst_mac = rule
+      return [dec_ttl,
+        parser.OFPActionSetField(eth_src=ROUTER_MAC),
+        parser.OFPActionSetField(eth_dst=dst_mac),
+        parser.OFPActionOutput(dst_port)
+      ]
+    return [dec_ttl, parser.OFPActionOutput(rule[1])]
+
+  def install_sink_tree(self, ip, tree=None):
+    """
+    Installa (o corregge) una regola per switch verso ip e restituisce quante FlowMod ha inviato
+    """
+    dst_dpid, dst_port, dst_mac = self.arp_table[ip]
+    if tree is None:
+      tree = self.get_sink_tree(dst_dpid)
+
+    desired = {dst_dpid: ('egress', dst_port, dst_mac)}
+    for dpid, (next_dpid, _) in tree.items():
+      desired[dpid] = ('transit', self.adjacency[dpid][next_dpid])
+
+    installed = self.proactive_flows.get(ip, {})
+    # Si aggiornano prima gli switch piu' vicini alla destinazione, cosi' un pacchetto
+    # inoltrato da una regola nuova trova gia' aggiornato il resto del percorso
+    changed = sorted(
+      (dpid for dpid, rule in desired.items() if installed.get(dpid) != rule),
+      key=lambda dpid: tree[dpid][1] if dpid in tree else 0
+    )
+
+    sent = 0
+    for dpid in changed:
+      dp = self.datapaths.get(dpid)
+      if dp is None:
+        del desired[dpid]
+        continue
+      parser = dp.ofproto_parser
+      match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IP, ipv4_dst=ip)
+      actions = self.sink_tree_actions(parser, desired[dpid])
+      dp.send_msg(parser.OFPFlowMod(datapath=dp, match=match, priority=10, instructions=[parser.OFPInstructionActions(ofproto_v1_3.OFPIT_APPLY_ACTIONS, actions)]))
+      sent += 1
+
+    # Switch da cui la destinazione non e' piu' raggiungibile
+    for dpid in installed.keys() - desired.keys():
+      dp = self.datapaths.get(dpid)
+      if dp is None: continue
+      parser = dp.ofproto_parser
+      match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IP, ipv4_dst=ip)
+      dp.send_msg(parser.OFPFlowMod(datapath=dp, command=dp.ofproto.OFPFC_DELETE_STRICT, out_port=dp.ofproto.OFPP_ANY, out_group=dp.ofproto.OFPG_ANY, match=match, priority=10))
+      sent += 1
+
+    self.proactive_flows[ip] = desired
+    return sent
+
+  def refresh_proactive_flows(self):
+    trees = {}
+    sent = 0
+    for ip, (dst_dpid, _, _) in list(self.arp_table.items()):
+      if dst_dpid not in trees:
+        trees[dst_dpid] = self.get_sink_tree(dst_dpid)
+      sent += self.install_sink_tree(ip, trees[dst_dpid])
+
+    if sent:
+      self.logger.info('Routing proattivo: %d FlowMod inviate per %d destinazioni', sent, len(self.arp_table))
+
+  def forward_proactive(self, msg, ip):
+    dp = msg.datapath
+    parser = dp.ofproto_parser
+    if dp.id not in self.proactive_flows.get(ip, {}):
+      self.install_sink_tree(ip)
+
+    rule = self.proactive_flows.get(ip, {}).get(dp.id)
+    if rule is None: return
+
+    actions = self.sink_tree_actions(parser, rule)
+    dp.send_msg(parser.OFPPacketOut(datapath=dp, buffer_id=msg.buffer_id, in_port=msg.match['in_port'], actions=actions, data=msg.data))
+
+  # --- INSTALLAZIONE PERCORSI (REATTIVA) ---
+  def path_rules(self, path, ip_dst, dst_port, dst_mac):
+    """
+    Regole (dpid, ip_dst, azioni) per instradare ip_dst lungo path, in ordine dall'egress all'ingress
+    """
+    rules = []
+    for i in range(len(path) - 1, -1, -1):
+      curr = path[i]
+      parser = self.datapaths[curr].ofproto_parser
+      dec_ttl = parser.OFPActionDecNwTtl()
+
+      if i == len(path) - 1:
+        # Ultimo switch (Egress)
+        actions = [dec_ttl,
+          parser.OFPActionSetField(eth_src=ROUTER_MAC),
+          parser.OFPActionSetField(eth_dst=dst_mac),
+          parser.OFPActionOutput(dst_port)
+        ]
+      else:
+        # Switch di ingresso e intermedi (Transit)
+        actions = [dec_ttl, parser.OFPActionOutput(self.adjacency[curr][path[i+1]])]
+      rules.append((curr, ip_dst, actions))
+    return rules
+
+  def route_rules(self, src, dst, ip_dst, dst_port, dst_mac):
+    if MULTIPATH_ROUTING:
+      return self.multipath_rules(src, dst, ip_dst, dst_port, dst_mac)
+
+    path = self.get_path(src, dst)
+    if not path: return None
+    self.register_flow(src, ip_dst, path, dst_port, dst_mac)
+    return self.path_rules(path, ip_dst, dst_port, dst_mac)
+
+  # --- MULTIPATH (GRUPPI SELECT) ---
+  def multipath_dag(self, dst_dpid):
+    engine = self.routing_engine
+    stamp = (engine.version, engine.weight_changes)
+    cached = self.multipath_dags.get(dst_dpid)
+    if cached is None or cached[0] != stamp:
+      cached = (stamp, engine.multipath(dst_dpid, MULTIPATH_SLACK, MULTIPATH_MAX_PATHS))
+      self.multipath_dags[dst_dpid] = cached
+    return cached[1]
+
+  def multipath_rules(self, src, dst, ip_dst, dst_port, dst_mac):
+    """
+    Regole per ip_dst su tutti gli switch dei percorsi da src a dst, dall'egress all'ingress:
+    lo switch di uscita consegna all'host, gli altri inoltrano al gruppo select di dst
+    """
+    dag = self.multipath_dag(dst)
+    if src != dst and src not in dag: return None
+
+    switches = [src]
+    for dpid in switches:
+      for peer, _, _ in dag.get(dpid, []):
+        if peer not in switches:
+          switches.append(peer)
+    # Il costo del primo prossimo hop e' la distanza minima da dst
+    switches.sort(key=lambda dpid: dag[dpid][0][2] if dpid != dst else 0)
+
+    rules = []
+    for dpid in switches:
+      parser = self.datapaths[dpid].ofproto_parser
+      if dpid == dst:
+        actions = self.sink_tree_actions(parser, ('egress', dst_port, dst_mac))
+      else:
+        self.update_multipath_group(dpid, dst, dag[dpid])
+        actions = [parser.OFPActionDecNwTtl(), parser.OFPActionGroup(dst)]
+      rules.append((dpid, ip_dst, actions))
+
+    # Per la telemetria: il percorso che segue sempre il prossimo hop migliore
+    path = [src]
+    while path[-1] != dst:
+      path.append(dag[path[-1]][0][0])
+    self.last_path = path
+    return rules
+
+  def update_multipath_group(self, dpid, dst_dpid, hops):
+    """
+    Gruppo select (group_id = dpid destinazione) con un bucket per prossimo hop, di peso
+    inversamente proporzionale al costo del percorso. Viene inviato solo se i bucket cambiano
+    """
+    best = hops[0][2]
+    buckets = tuple((port_no, max(1, round(100 * best / cost))) for _, port_no, cost in hops)
+    installed = self.multipath_groups.get((dpid, dst_dpid))
+    if installed == buckets: return False
+
+    dp = self.datapaths[dpid]
+    ofproto = dp.ofproto
+    parser = dp.ofproto_parser
+    command = ofproto.OFPGC_ADD if installed is None else ofproto.OFPGC_MODIFY
+    dp.send_msg(parser.OFPGroupMod(dp, command, ofproto.OFPGT_SELECT, dst_dpid, [
+      parser.OFPBucket(weight=weight, watch_port=ofproto.OFPP_ANY, watch_group=ofproto.OFPG_ANY, actions=[parser.OFPActionOutput(port_no)])
+      for port_no, weight in buckets
+    ]))
+    self.multipath_groups[(dpid, dst_dpid)] = buckets
+    self.install_stats['group_mods'] += 1
+    return True
+
+  def refresh_multipath_groups(self):
+    # Ribilancia i gruppi installati con i pesi correnti; i gruppi di switch scomparsi vengono dimenticati
+    changed = 0
+    for dpid, dst_dpid in list(self.multipath_groups):
+      if dpid not in self.datapaths:
+        del self.multipath_groups[(dpid, dst_dpid)]
+        continue
+      hops = self.multipath_dag(dst_dpid).get(dpid)
+      if hops and self.update_multipath_group(dpid, dst_dpid, hops):
+        changed += 1
+    if changed:
+      self.logger.debug('Multipath: %d gruppi aggiornati', changed)
+
+  def install_rules(self, rules, key, msg, actions):
+    """
+    Invia le FlowMod nell'ordine dato, poi una BarrierRequest per switch: il pacchetto
+    (e quelli arrivati nel frattempo per la stessa chiave) esce solo quando tutte le
+    barrier hanno risposto, o dopo BARRIER_TIMEOUT
+    """
+    pending = {'key': key, 'packets': [msg], 'actions': actions, 'barriers': set(), 'released': False, 'start': time.perf_counter()}
+    now = time.monotonic()
+
+    # Registrata prima delle barrier: la risposta puo' arrivare appena la richiesta e' inviata
+    self.pending_installs[key] = pending
+    self.send_barriers(self.send_rules(rules), pending)
+
+    self.recent_installs[key] = now
+    self.install_stats['installs'] += 1
+    if not pending['barriers']:
+      # Tutte le regole erano gia' installate
+      self.release_packets(pending)
+      return
+    hub.spawn_after(BARRIER_TIMEOUT, self.release_packets, pending, True)
+
+  def send_rules(self, rules, command=ofproto_v1_3.OFPFC_ADD):
+    """
+    Invia una FlowMod per regola, nell'ordine dato, e restituisce gli switch toccati.
+    Con SHADOW_FLOW_TABLE le ADD di regole identiche a quelle gia' installate non vengono inviate
+    """
+    touched = []
+    now = time.monotonic()
+    for dpid, ip_dst, rule_actions in rules:
+      dp = self.datapaths[dpid]
+      parser = dp.ofproto_parser
+      match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IP, ipv4_dst=ip_dst)
+      instructions = [parser.OFPInstructionActions(ofproto_v1_3.OFPIT_APPLY_ACTIONS, rule_actions)]
+
+      if not SHADOW_FLOW_TABLE:
+        flow_mod = parser.OFPFlowMod(command=command, idle_timeout=FLOW_IDLE_TIMEOUT, hard_timeout=FLOW_HARD_TIMEOUT, datapath=dp, match=match, priority=10, instructions=instructions)
+      elif command == ofproto_v1_3.OFPFC_ADD:
+        if self.flow_table.suppress(dpid, ip_dst, rule_actions, now): continue
+        cookie, idle_timeout = self.flow_table.add(dpid, ip_dst, rule_actions, now)
+        flow_mod = parser.OFPFlowMod(command=command, cookie=cookie, idle_timeout=idle_timeout, hard_timeout=FLOW_HARD_TIMEOUT, flags=ofproto_v1_3.OFPFF_SEND_FLOW_REM, datapath=dp, match=match, priority=10, instructions=instructions)
+      else:
+        self.flow_table.modify(dpid, ip_dst, rule_actions)
+        flow_mod = parser.OFPFlowMod(command=command, datapath=dp, match=match, priority=10, instructions=instructions)
+
+      dp.send_msg(flow_mod)
+      self.install_stats['flow_mods'] += 1
+      if dpid not in touched:
+        touched.append(dpid)
+    return touched
+
+  def send_barriers(self, dpids, pending):
+    for dpid in dpids:
+      dp = self.datapaths[dpid]
+      barrier = dp.ofproto_parser.OFPBarrierRequest(dp)
+      xid = dp.set_xid(barrier)
+      pending['barriers'].add((dpid, xid))
+      self.pending_barriers[(dpid, xid)] = pending
+      dp.send_msg(barrier)
+
+  def release_packets(self, pending, timeout=False):
+    if pending['released']: return
+    pending['released'] = True
+    if timeout:
+      self.install_stats['barrier_timeouts'] += 1
+    if METRICS_ENABLED and 'start' in pending:
+      self.metrics.observe('flow_install_seconds', time.perf_counter() - pending['start'], outcome='timeout' if timeout else 'barrier')
+
+    for barrier in pending['barriers']:
+      self.pending_barriers.pop(barrier, None)
+    if self.pending_installs.get(pending['key']) is pending:
+      del self.pending_installs[pending['key']]
+
+    for msg in pending['packets']:
+      dp = msg.datapath
+      parser = dp.ofproto_parser
+      dp.send_msg(parser.OFPPacketOut(datapath=dp, buffer_id=msg.buffer_id, in_port=msg.match['in_port'], actions=pending['actions'], data=msg.data))
+
+    if pending.get('on_release'):
+      pending['on_release']()
+
+  @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+  def _barrier_reply_handler(self, ev):
+    msg = ev.msg
+    pending = self.pending_barriers.pop((msg.datapath.id, msg.xid), None)
+    if pending is None: return
+
+    pending['barriers'].discard((msg.datapath.id, msg.xid))
+    if not pending['barriers']:
+      self.release_packets(pending)
+
+  @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+  def _flow_removed_handler(self, ev):
+    msg = ev.msg
+    ofproto = msg.datapath.ofproto
+    if msg.priority != 10 or 'ipv4_dst' not in msg.match: return
+
+    if msg.reason == ofproto.OFPRR_IDLE_TIMEOUT:
+      reason = 'idle'
+    elif msg.reason == ofproto.OFPRR_HARD_TIMEOUT:
+      reason = 'hard'
+    else:
+      reason = 'delete'
+    self.flow_table.flow_removed(msg.datapath.id, msg.match['ipv4_dst'], msg.cookie, reason, time.monotonic())
+
+  def prune_recent_installs(self):
+    # Oltre l'hard timeout le regole sono scadute: un nuovo packet-in non e' piu' un duplicato.
+    # Con FLOW_HARD_TIMEOUT = 0 le regole non hanno hard timeout e nessuna scade per eta'
+    now = time.monotonic()
+    self.flow_table.prune(now)
+    if not FLOW_HARD_TIMEOUT: return
+    deadline = now - FLOW_HARD_TIMEOUT
+    self.recent_installs = {key: t for key, t in self.recent_installs.items() if t > deadline}
+    self.active_flows = {key: flow for key, flow in self.active_flows.items() if flow['installed'] > deadline}
+
+  # --- REROUTING DEI FLUSSI ATTIVI ---
+  def register_flow(self, src, ip_dst, path, dst_port, dst_mac):
+    self.active_flows[(src, ip_dst)] = {
+      'path': path,
+      'dst_port': dst_port,
+      'dst_mac': dst_mac,
+      'installed': time.monotonic()
+    }
+
+  def path_cost(self, path):
+    cost = 0
+    for u, v in zip(path, path[1:]):
+      port_no = self.adjacency.get(u, {}).get(v)
+      if port_no is None: return float('inf')
+      cost += self.link_weigths.get((u, port_no), 10)
+    return cost
+
+  def reroute_congested_flows(self):
+    """
+    Confronta il percorso di ogni flusso registrato con il migliore secondo i pesi correnti
+    e sposta i REROUTE_MAX_PER_CYCLE flussi che guadagnano di piu'
+    """
+    last_path = self.last_path
+    candidates = []
+    for key, flow in self.active_flows.items():
+      if key in self.pending_installs: continue
+      path = flow['path']
+      best_path = self.get_path(path[0], path[-1])
+      if not best_path or best_path == path: continue
+
+      current_cost = self.path_cost(path)
+      best_cost = self.path_cost(best_path)
+      if current_cost > (1 + REROUTE_THRESHOLD) * best_cost:
+        candidates.append((current_cost - best_cost, key, best_path))
+    self.last_path = last_path
+
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    for _, key, best_path in candidates[:REROUTE_MAX_PER_CYCLE]:
+      self.reroute_flow(key, best_path)
+    if len(candidates) > REROUTE_MAX_PER_CYCLE:
+      self.logger.debug('Rerouting: %d flussi rimandati al prossimo ciclo', len(candidates) - REROUTE_MAX_PER_CYCLE)
+
+  def reroute_flow(self, key, new_path):
+    """
+    Make-before-break: gli switch che non erano sul vecchio percorso ricevono la regola (ADD)
+    e solo dopo le loro barrier si modificano (MODIFY) quelli del vecchio percorso che cambiano
+    prossimo hop, dal piu' vicino alla destinazione all'ingresso
+    """
+    flow = self.active_flows[key]
+    old_path = flow['path']
+    old_next_hop = dict(zip(old_path, old_path[1:]))
+    new_next_hop = dict(zip(new_path, new_path[1:]))
+
+    new_rules = []
+    changed_rules = []
+    for rule in self.path_rules(new_path, key[1], flow['dst_port'], flow['dst_mac']):
+      dpid = rule[0]
+      if dpid not in old_path:
+        new_rules.append(rule)
+      elif old_next_hop.get(dpid) != new_next_hop.get(dpid):
+        changed_rules.append(rule)
+
+    flow['path'] = new_path
+    self.install_stats['reroutes'] += 1
+    self.logger.info('Rerouting %s -> %s: %s', key[0], key[1], new_path)
+
+    modify = lambda: self.send_rules(changed_rules, ofproto_v1_3.OFPFC_MODIFY_STRICT)
+    touched = self.send_rules(new_rules)
+    if not touched:
+      modify()
+      return
+
+    pending = {'key': None, 'packets': [], 'actions': None, 'barriers': set(), 'released': False, 'on_release': modify}
+    self.send_barriers(touched, pending)
+    hub.spawn_after(BARRIER_TIMEOUT, self.release_packets, pending, True)
+
   # --- ARP PROBE (SAFE FLOOD) ---
   def send_arp_probe(self, target_ip):
     # print(f"--- Sending ARP Probe for {target_ip} ---")
@@ -289,57 +1055,183 @@ class L3Router(app_manager.RyuApp):
     p.add_protocol(a)
     p.serialize()
 
-    for dpid in self.switches:
-      dp = self.datapaths[dpid]
-      # Filtro base: inviamo flood, ma la logica del routing eviterà loop sui pacchetti IP
-      # L'ARP storm è mitigato dal fatto che è un probe controllato
-      non_edge_ports = set(self.adjacency[dpid].values())
-      
-      sw_obj_list = get_switch(self.topology_api_app, dpid)
-      if not sw_obj_list: continue
-      sw_obj = sw_obj_list[0]
-      
-      actions = []
-      for port in sw_obj.ports:
-        if port.port_no > ofproto_v1_3.OFPP_MAX: continue
-        # Invia SOLO se la porta non è collegata a un altro switch (Edge Port)
-        if port.port_no not in non_edge_ports:
-          actions.append(dp.ofproto_parser.OFPActionOutput(port.port_no))
+    for dpid, ports in self.edge_ports.items():
+      dp = self.datapaths.get(dpid)
+      # Invia SOLO sulle porte non collegate a un altro switch (Edge Port)
+      if dp is None or not ports: continue
+
+      actions = [dp.ofproto_parser.OFPActionOutput(port_no) for port_no in sorted(ports)]
+      out = dp.ofproto_parser.OFPPacketOut(
+        datapath=dp, 
+        buffer_id=dp.ofproto.OFP_NO_BUFFER,
+        in_port=dp.ofproto.OFPP_CONTROLLER, 
+        actions=actions, 
+        data=p.data
+      )
+      dp.send_msg(out)
+    self.arp_stats['probes'] += 1
+
+  def update_port_peers(self):
+    # Le porte verso altri switch vengono dai link; quelle verso gli host da learn_host
+    self.port_peers = {key: peer for key, peer in self.port_peers.items() if peer[0] == 'host'}
+    for dpid, port_no, peer_dpid in self.get_links():
+      self.port_peers[(dpid, port_no)] = ('switch', peer_dpid)
+
+  def is_switch_port(self, dpid, port_no):
+    peer = self.port_peers.get((dpid, port_no))
+    return peer is not None and peer[0] == 'switch'
+
+  def plot_node(self, peer):
+    """
+    Nodo di print_graphs per il vicino di una porta: switch -> dpid + numero di host, host -> numero
+    dell'host ricavato dal MAC (Mininet con autoSetMacs assegna 00:00:00:00:00:0N a hN)
+    """
+    if peer is None: return None
+    kind, value = peer
+    if kind == 'switch':
+      return value + self.plot_offset
+    entry = self.arp_table.get(value)
+    return int(entry[2].replace(':', ''), 16) if entry else None
+
+  def update_edge_ports(self):
+    # Porte fisiche di ogni switch meno quelle collegate ad altri switch
+    self.edge_ports = {
+      dpid: {port_no for port_no in ports if not self.is_switch_port(dpid, port_no)}
+      for dpid, ports in self.switch_ports.items()
+    }
+
+  def queue_for_arp(self, msg, pkt):
+    """
+    Trattiene il pacchetto finche' la destinazione non risponde all'ARP probe: un solo probe
+    per destinazione ogni ARP_PROBE_INTERVAL secondi, i pacchetti ripartono in learn_host
+    """
+    now = time.monotonic()
+    pending = self.pending_arp.get(pkt.dst_ip)
+    if pending is None:
+      pending = {'first': now, 'last_probe': None, 'packets': deque()}
+      self.pending_arp[pkt.dst_ip] = pending
+
+    if len(pending['packets']) >= ARP_PENDING_MAX:
+      pending['packets'].popleft()
+      self.arp_stats['dropped'] += 1
+    pending['packets'].append((msg, pkt))
+    self.arp_stats['queued'] += 1
+
+    if pending['last_probe'] is None or now - pending['last_probe'] >= ARP_PROBE_INTERVAL:
+      pending['last_probe'] = now
+      self.send_arp_probe(pkt.dst_ip)
+
+  def release_arp_queue(self, ip):
+    pending = self.pending_arp.pop(ip, None)
+    if pending is None: return
+    if METRICS_ENABLED:
+      self.metrics.observe('arp_resolution_seconds', time.monotonic() - pending['first'])
+    for msg, pkt in pending['packets']:
+      self.route_ip_packet(msg, pkt)
+    self.arp_stats['released'] += len(pending['packets'])
+
+  def expire_pending_arp(self):
+    deadline = time.monotonic() - ARP_PENDING_TIMEOUT
+    for ip in [ip for ip, pending in self.pending_arp.items() if pending['first'] < deadline]:
+      self.arp_stats['dropped'] += len(self.pending_arp.pop(ip)['packets'])
+
+  def parse_packet(self, data):
+    if FAST_PACKET_PARSER:
+      pkt = parse_packet(data)
+      if pkt is not None:
+        return pkt
+    return parse_packet_full(data)
+
+  def route_ip_packet(self, msg, pkt, computed=False):
+    dpid = msg.datapath.id
+
+    if pkt.dst_ip in self.arp_table and PROACTIVE_ROUTING:
+      self.forward_proactive(msg, pkt.dst_ip)
+    elif pkt.dst_ip in self.arp_table:
+      key = (dpid, pkt.dst_ip)
+
+      # Regole gia' in installazione: il pacchetto aspetta le barrier insieme al primo
+      if key in self.pending_installs:
+        self.pending_installs[key]['packets'].append(msg)
+        self.install_stats['held_packets'] += 1
+        return
+      if key in self.recent_installs and not computed:
+        self.install_stats['duplicate_packet_ins'] += 1
+      if SHADOW_FLOW_TABLE:
+        # Il packet-in dimostra che lo switch non ha la regola per questa destinazione
+        self.flow_table.invalidate(dpid, pkt.dst_ip)
+
+      dst_dpid, dst_port, dst_mac = self.arp_table[pkt.dst_ip]
+      # Il mittente puo' non essere noto: un pacchetto da un link tra switch non ne rivela la posizione
+      reverse = BIDIRECTIONAL_INSTALL and pkt.src_ip in self.arp_table and (dst_dpid, pkt.src_ip) not in self.recent_installs
+
+      # Con i worker il pacchetto riparte da qui quando i percorsi sono in cache
+      # (computed: se nel frattempo sono stati invalidati si calcolano sull'hub)
+      if PATH_WORKERS and not MULTIPATH_ROUTING and not computed:
+        pairs = [(dpid, dst_dpid)]
+        if reverse:
+          pairs.append((dst_dpid, self.arp_table[pkt.src_ip][0]))
+        if self.request_paths(msg, pkt, pairs): return
+
+      rules = self.route_rules(dpid, dst_dpid, pkt.dst_ip, dst_port, dst_mac)
       
-      if actions:
-        out = dp.ofproto_parser.OFPPacketOut(
-          datapath=dp, 
-          buffer_id=dp.ofproto.OFP_NO_BUFFER,
-          in_port=dp.ofproto.OFPP_CONTROLLER, 
-          actions=actions, 
-          data=p.data
-        )
-        dp.send_msg(out)
+      if not rules: return
+
+      # Il PacketOut usa le stesse azioni della regola dello switch di ingresso (l'ultima)
+      actions = rules[-1][2]
+
+      # Percorso inverso verso il mittente, installato insieme a quello diretto
+      # cosi' la risposta non genera un secondo packet-in
+      if reverse:
+        src_dpid, src_port, src_mac = self.arp_table[pkt.src_ip]
+        last_path = self.last_path
+        reverse_rules = self.route_rules(dst_dpid, src_dpid, pkt.src_ip, src_port, src_mac)
+        self.last_path = last_path
+        if reverse_rules:
+          rules = reverse_rules + rules
+          self.recent_installs[(dst_dpid, pkt.src_ip)] = time.monotonic()
+          self.install_stats['reverse_installs'] += 1
+
+      self.install_rules(rules, key, msg, actions)
+    else:
+      self.queue_for_arp(msg, pkt)
 
   @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
   def _packet_in_handler(self, ev):
-    msg = ev.msg
+    if self.trace is not None:
+      msg = ev.msg
+      self.trace.write({'type': 'packet_in', 'dpid': msg.datapath.id, 'in_port': msg.match['in_port'], 'data': msg.data.hex()})
+
+    if not METRICS_ENABLED:
+      self.handle_packet_in(ev.msg)
+      return
+
+    # Dall'arrivo all'invio di FlowMod/PacketOut (o all'accodamento del pacchetto)
+    start = time.perf_counter()
+    self.handle_packet_in(ev.msg)
+    self.metrics.observe('packet_in_seconds', time.perf_counter() - start)
+
+  def handle_packet_in(self, msg):
     dp = msg.datapath
     dpid = dp.id
     parser = dp.ofproto_parser
     in_port = msg.match['in_port']
 
-    pkt = packet.Packet(msg.data)
-    eth = pkt.get_protocol(ethernet.ethernet)
+    pkt = self.parse_packet(msg.data)
+    if pkt is None: return
     
-    if eth.ethertype == ether_types.ETH_TYPE_LLDP: return
+    if pkt.ethertype == ether_types.ETH_TYPE_LLDP: return
 
     # --- GESTIONE ARP ---
-    if eth.ethertype == ether_types.ETH_TYPE_ARP:
-        a = pkt.get_protocol(arp.arp)
-        self.arp_table[a.src_ip] = (dpid, in_port, eth.src)
+    if pkt.ethertype == ether_types.ETH_TYPE_ARP:
+        self.learn_host(pkt.src_ip, dpid, in_port, pkt.eth_src)
 
-        if a.opcode == arp.ARP_REQUEST:
+        if pkt.opcode == arp.ARP_REQUEST:
             pkt_reply = packet.Packet()
-            pkt_reply.add_protocol(ethernet.ethernet(dst=eth.src, src=ROUTER_MAC, ethertype=ether_types.ETH_TYPE_ARP))
+            pkt_reply.add_protocol(ethernet.ethernet(dst=pkt.eth_src, src=ROUTER_MAC, ethertype=ether_types.ETH_TYPE_ARP))
             pkt_reply.add_protocol(arp.arp(opcode=arp.ARP_REPLY, 
-                                          src_mac=ROUTER_MAC, src_ip=a.dst_ip,
-                                          dst_mac=eth.src, dst_ip=a.src_ip))
+                                          src_mac=ROUTER_MAC, src_ip=pkt.dst_ip,
+                                          dst_mac=pkt.eth_src, dst_ip=pkt.src_ip))
             pkt_reply.serialize()
             out = parser.OFPPacketOut(datapath=dp, buffer_id=msg.buffer_id, in_port=ofproto_v1_3.OFPP_CONTROLLER, 
                                       actions=[parser.OFPActionOutput(in_port)], data=pkt_reply.data)
@@ -347,69 +1239,11 @@ class L3Router(app_manager.RyuApp):
         return
 
     # --- GESTIONE IP (ROUTING L3) ---
-    if eth.ethertype == ether_types.ETH_TYPE_IP:
-      ip_pkt = pkt.get_protocol(ipv4.ipv4)
-      if ip_pkt.src not in self.arp_table:
-        self.arp_table[ip_pkt.src] = (dpid, in_port, eth.src)
-
-      if ip_pkt.dst in self.arp_table:
-        dst_dpid, dst_port, dst_mac = self.arp_table[ip_pkt.dst]
-        path_nodes = self.get_path(dpid, dst_dpid)
-        
-        if not path_nodes: return
-
-        # DEFINIAMO L'AZIONE TTL UNA VOLTA PER TUTTE
-        dec_ttl = parser.OFPActionDecNwTtl()
-
-        # CASO 1: Destinazione sullo stesso switch
-        if len(path_nodes) == 1:
-          actions = [dec_ttl, # <--- AGGIUNTO QUI
-            parser.OFPActionSetField(eth_src=ROUTER_MAC),
-            parser.OFPActionSetField(eth_dst=dst_mac),
-            parser.OFPActionOutput(dst_port)
-          ]
-          match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IP, ipv4_dst=ip_pkt.dst)
-          dp.send_msg(parser.OFPFlowMod(idle_timeout=5, hard_timeout=15, datapath=dp, match=match, priority=10, instructions=[parser.OFPInstructionActions(ofproto_v1_3.OFPIT_APPLY_ACTIONS, actions)]))
-          dp.send_msg(parser.OFPPacketOut(datapath=dp, buffer_id=msg.buffer_id, in_port=in_port, actions=actions, data=msg.data))
-          return
-
-        # CASO 2: Percorso Multi-Hop
-        
-        # A. Configurazione PRIMO switch (Ingress)
-        next_node = path_nodes[1]
-        out_port = self.adjacency[dpid][next_node]
-        match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IP, ipv4_dst=ip_pkt.dst)
-        
-        # <--- AGGIUNTO QUI: Il primo switch deve decrementare!
-        actions = [dec_ttl, parser.OFPActionOutput(out_port)] 
-        
-        dp.send_msg(parser.OFPFlowMod(idle_timeout=5, hard_timeout=15, datapath=dp, match=match, priority=10, instructions=[parser.OFPInstructionActions(ofproto_v1_3.OFPIT_APPLY_ACTIONS, actions)]))
-
-        # B. Configurazione SWITCH SUCCESSIVI
-        for i in range(1, len(path_nodes)):
-          curr = path_nodes[i]
-          curr_dp = self.datapaths[curr]
-          
-          if i == len(path_nodes) - 1:
-            # Ultimo switch (Egress)
-            curr_actions = [
-              dec_ttl, # <--- C'era, OK.
-              parser.OFPActionSetField(eth_src=ROUTER_MAC),
-              parser.OFPActionSetField(eth_dst=dst_mac),
-              parser.OFPActionOutput(dst_port)
-            ]
-          else:
-            # Switch Intermedi (Transit)
-            nxt = path_nodes[i+1]
-            # <--- AGGIUNTO QUI: FONDAMENTALE PER I SALTI INTERMEDI
-            curr_actions = [dec_ttl, parser.OFPActionOutput(self.adjacency[curr][nxt])]
-          
-          curr_dp.send_msg(parser.OFPFlowMod(idle_timeout=5, hard_timeout=15, datapath=curr_dp, match=match, priority=10, instructions=[parser.OFPInstructionActions(ofproto_v1_3.OFPIT_APPLY_ACTIONS, curr_actions)]))
-
-        # C. Invia il pacchetto originale (PacketOut)
-        dp.send_msg(parser.OFPPacketOut(datapath=dp, buffer_id=msg.buffer_id, in_port=in_port, actions=actions, data=msg.data))
-      else:
-        self.send_arp_probe(ip_pkt.dst)
+    if pkt.ethertype == ether_types.ETH_TYPE_IP:
+      if pkt.src_ip not in self.arp_table:
+        self.learn_host(pkt.src_ip, dpid, in_port, pkt.eth_src)
+
+      self.route_ip_packet(msg, pkt)
 
 
   @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
@@ -420,4 +1254,13 @@ class L3Router(app_manager.RyuApp):
     match = parser.OFPMatch()
     actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, ofproto.OFPCML_NO_BUFFER)]
     inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
-    dp.send_msg(parser.OFPFlowMod(datapath=dp, match=match, priority=0, instructions=inst))
\ No newline at end of file
+    dp.send_msg(parser.OFPFlowMod(datapath=dp, match=match, priority=0, instructions=inst))
+    # Lo switch (ri)connesso riparte con la tabella vuota: anche le regole proattive vanno reinstallate
+    self.flow_table.forget_switch(dp.id)
+    for flows in self.proactive_flows.values():
+      flows.pop(dp.id, None)
+
+    if MULTIPATH_ROUTING:
+      # Lo switch (ri)connesso non deve avere gruppi di una connessione precedente
+      dp.send_msg(parser.OFPGroupMod(dp, ofproto.OFPGC_DELETE, ofproto.OFPGT_SELECT, ofproto.OFPG_ALL))
+      self.multipath_groups = {key: buckets for key, buckets in self.multipath_groups.items() if key[0] != dp.id}
\ No newline at end of file
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+
+# Descrizione degli esperimenti eseguiti da topology.py, senza dipendenze da Mininet. Formato (JSON):
+#   {
+#     "defaults": {"receiver": "h1", "proto": "UDP", "duration": 10, "repetitions": 1},
+#     "experiments": [{"name": "case_#1", "senders": {"h2": "100M", ...}, "receiver": "h1",
+#                      "proto": "UDP", "duration": secondi, "repetitions": 1}, ...]
+#   }
+# I campi mancanti di un esperimento valgono quelli di defaults, name di default e' case_#N.
+# L'output va in data/<name>, con piu' ripetizioni in data/<name>/rep_<k>.
+#
+# Uso: python experiment_spec.py [experiments.json]  (stampa l'ordine di esecuzione previsto)
+
+EXPERIMENTS_PATH = 'experiments.json'
+
+DEFAULTS = {'receiver': 'h1', 'proto': 'UDP', 'duration': 10, 'repetitions': 1}
+
+def default_experiments():
+  """
+  I quattro casi verso h1 usati finora
+  """
+  cases = [
+    {'h2': '100M'},
+    {'h2': '100M', 'h3': '100M'},
+    {'h2': '100M', 'h3': '100M', 'h4': '5M'},
+    {'h2': '100M', 'h3': '100M', 'h4': '5M', 'h5': '200M'},
+  ]
+  return {'defaults': dict(DEFAULTS), 'experiments': [{'senders': senders} for senders in cases]}
+
+def load_experiments(path=EXPERIMENTS_PATH):
+  """
+  Esperimenti salvati in path, oppure i quattro casi di default se il file non esiste
+  """
+  if not os.path.exists(path):
+    return default_experiments()
+  with open(path) as file:
+    return json.load(file)
+
+def expand(spec, hosts=None):
+  """
+  Un run per ogni esperimento e ripetizione, con i default applicati: [{'name', 'repetition',
+  'output_dir', 'senders': {host: rate}, 'receiver', 'proto', 'duration'}].
+  hosts: nomi degli host della topologia, per controllare la descrizione. Errori -> RuntimeError
+  """
+  defaults = dict(DEFAULTS, **spec.get('defaults', {}))
+  runs = []
+  names = set()
+  for i, experiment in enumerate(spec['experiments']):
+    experiment = dict(defaults, **experiment)
+    name = experiment.get('name', f'case_#{i+1}')
+    senders = experiment.get('senders') or {}
+    receiver = experiment['receiver']
+    proto = experiment['proto'].upper()
+    duration = float(experiment['duration'])
+    repetitions = int(experiment['repetitions'])
+
+    if name in names: raise RuntimeError(f'{name}: nome ripetuto')
+    if not senders: raise RuntimeError(f'{name}: senders vuoto')
+    if receiver in senders: raise RuntimeError(f'{name}: {receiver} e\' sia sorgente che destinazione')
+    if proto not in ('TCP', 'UDP'): raise RuntimeError(f'{name}: protocollo {proto} non valido')
+    if duration <= 0 or repetitions < 1: raise RuntimeError(f'{name}: durata e ripetizioni devono essere positive')
+    unknown = sorted((set(senders) | {receiver}) - set(hosts)) if hosts is not None else []
+    if unknown: raise RuntimeError(f'{name}: host sconosciuti {unknown}')
+    names.add(name)
+
+    for k in range(1, repetitions + 1):
+      runs.append({
+        'name': name,
+        'repetition': k,
+        'output_dir': name if repetitions == 1 else f'{name}/rep_{k}',
+        'senders': dict(senders),
+        'receiver': receiver,
+        'proto': proto,
+        'duration': duration
+      })
+  return runs
+
+def run_hosts(run):
+  return set(run['senders']) | {run['receiver']}
+
+def ready(pending, busy):
+  """
+  Run di pending (nell'ordine della descrizione) che possono partire mentre gli host in busy sono
+  occupati. Un run parte solo se i suoi host non sono occupati ne' usati da un run precedente
+  ancora in attesa: i run con host in comune (stesso collo di bottiglia, stesso server iperf
+  di destinazione) restano in sequenza, quelli con host disgiunti girano in parallelo
+  """
+  startable = []
+  blocked = set(busy)
+  for run in pending:
+    hosts = run_hosts(run)
+    if not hosts & blocked:
+      startable.append(run)
+    blocked |= hosts
+  return startable
+
+def plan(runs, overhead=0):
+  """
+  Simulazione dell'esecuzione: ([(istante di partenza, run)], durata totale), con overhead secondi
+  di lancio e attesa oltre la durata di ogni run
+  """
+  pending = list(runs)
+  running = []  # (fine, run)
+  starts = []
+  now = 0
+  while pending or running:
+    busy = set().union(*(run_hosts(run) for _, run in running))
+    for run in ready(pending, busy):
+      pending.remove(run)
+      running.append((now + run['duration'] + overhead, run))
+      starts.append((now, run))
+    now = min(end for end, _ in running)
+    running = [(end, run) for end, run in running if end > now]
+  return starts, now
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Mostra l'ordine di esecuzione degli esperimenti")
+  parser.add_argument('path', nargs='?', default=EXPERIMENTS_PATH)
+  parser.add_argument('--overhead', type=float, default=2, help='secondi per run oltre la durata')
+  args = parser.parse_args()
+
+  runs = expand(load_experiments(args.path))
+  starts, total = plan(runs, args.overhead)
+  for start, run in starts:
+    senders = ', '.join(f'{host} {rate}' for host, rate in run['senders'].items())
+    print(f"{start:7.1f}s  {run['output_dir']}: {senders} -> {run['receiver']} {run['proto']} {run['duration']:g}s")
+  sequential = sum(run['duration'] + args.overhead for run in runs)
+  print(f'{len(runs)} run, durata prevista {total:.1f}s (in sequenza {sequential:.1f}s)')
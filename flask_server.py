@@ -1,79 +1,273 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+from ssh_pool import SSHPool, SSHTransport, LocalTransport
+from jobs import JobManager, QueueFull
+from iperf_stream import StreamHub, parse_iperf_line
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
+import threading
+import atexit
+import json
+import math
+import time
 import os
 
 app = Flask(__name__)
 
+# Comandi sugli host attraverso sessioni SSH persistenti (ssh_pool.py).
+# Con SSH_TRANSPORT=local i comandi girano sulla macchina del server (prove senza sshd)
+SSH_TRANSPORT = os.environ.get('SSH_TRANSPORT', 'ssh')
+SSH_USER = 'root'
+SSH_COMMAND_TIMEOUT = 5
+SSH_IDLE_TIMEOUT = 60
+SSH_HEALTH_INTERVAL = 10
+
+# Margine tra l'arrivo di /start_iperf_batch e la partenza comune dei client, e thread per i lanci
+BATCH_START_DELAY = 1
+BATCH_MAX_WORKERS = 32
+
+# Le richieste diventano job (jobs.py): al massimo JOB_WORKERS in esecuzione e JOB_MAX_QUEUED in coda,
+# conservati per JOB_RETENTION secondi dopo la fine. Thread del server HTTP
+JOB_WORKERS = 16
+JOB_MAX_QUEUED = 256
+JOB_RETENTION = 600
+SERVER_THREADS = 32
+
+# L'output CSV dei client arriva al server attraverso la sessione SSH: viene scritto nei file di log
+# e pubblicato su /jobs/<id>/stream (Server-Sent Events). Intervallo dei report di iperf, eventi
+# tenuti in memoria per job e intervallo dei keepalive dello stream
+IPERF_INTERVAL = 0.2
+STREAM_MAX_EVENTS = 10000
+STREAM_KEEPALIVE = 15
+
+# Durata dei client se la richiesta non specifica 'duration' (secondi)
+IPERF_DURATION = 10
+
+ssh_pool = SSHPool(
+  transport=LocalTransport() if SSH_TRANSPORT == 'local' else SSHTransport(user=SSH_USER),
+  idle_timeout=SSH_IDLE_TIMEOUT,
+  health_interval=SSH_HEALTH_INTERVAL
+)
+atexit.register(ssh_pool.close_all)
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS)
+job_manager = JobManager(max_workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED, retention=JOB_RETENTION)
+stream_hub = StreamHub(IPERF_INTERVAL, max_events=STREAM_MAX_EVENTS, retention=JOB_RETENTION)
+
 # Ottieni il percorso assoluto della cartella dove gira il server
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 data_dir = os.path.join(BASE_DIR, 'data')
 os.makedirs(data_dir, exist_ok=True)
 
 
-@app.route('/start_iperf', methods=['POST'])
-def start_iperf():
-  data = request.json
-  src_ip = data.get('IP_SRC')
-  dst_ip = data.get('IP_DEST')
+def parse_iperf_entry(data, out_dir):
+  """
+  Parametri di un client iperf presi dalla richiesta: (entry, None) oppure (None, errore)
+  """
   src_name = data.get('SRC_NAME')
   dst_name = data.get('DST_NAME')
-  out_dir = data.get('RUNTIME_OUTPUT_DIR')
   l4_proto = data.get('L4_proto', 'UDP').upper()
   src_rate = data.get('src_rate')
+  duration = data.get('duration', IPERF_DURATION)
 
   if l4_proto not in ['TCP', 'UDP']:
-    return jsonify({'error': 'Protocollo non valido. Usa TCP o UDP'}), 400
+    return None, 'Protocollo non valido. Usa TCP o UDP'
+  if not src_rate:
+    return None, 'src_rate non valido'
+  if not isinstance(duration, (int, float)) or duration <= 0:
+    return None, 'duration non valida'
 
-  try:
-    if not src_rate: raise ValueError
-  except ValueError:
-    return jsonify({'error': 'src_rate non valido'}), 400
-
-  os.makedirs('data', exist_ok=True)
+  return {
+    'sender': f'{src_name}_to_{dst_name}',
+    'src_ip': data.get('IP_SRC'),
+    'dst_ip': data.get('IP_DEST'),
+    'proto': l4_proto,
+    'rate': src_rate,
+    'duration': duration,
+    'log_path': os.path.join(data_dir, out_dir, f'client_{src_name}_to_{dst_name}.csv')
+  }, None
 
-  if l4_proto == 'UDP':
-    iperf_cmd = f'iperf -c {dst_ip} -u -b {src_rate} -t 10 -i 0.2 -y C'
+def iperf_command(entry, start_at=None):
+  """
+  Comando remoto del client, con l'output su stdout (letto da read_iperf_output).
+  Con start_at il client aspetta quell'istante (time.time(): gli host Mininet condividono
+  l'orologio) e prima di partire stampa 'start <istante effettivo>'
+  """
+  if entry['proto'] == 'UDP':
+    iperf_cmd = f"iperf -c {entry['dst_ip']} -u -b {entry['rate']} -t {entry['duration']} -i {IPERF_INTERVAL} -y C"
   else:
-    iperf_cmd = f'stdbuf -oL iperf -c {dst_ip} -t 10 -i 0.2 -y C'
+    iperf_cmd = f"stdbuf -oL iperf -c {entry['dst_ip']} -t {entry['duration']} -i {IPERF_INTERVAL} -y C"
 
-  log_path = os.path.join(data_dir, out_dir, f'client_{src_name}_to_{dst_name}.csv')
+  if start_at is None:
+    return f"stdbuf -oL {iperf_cmd} 2>&1"
 
-  ssh_cmd = (
-    f"ssh -o StrictHostKeyChecking=no root@{src_ip} "
-    f"\"stdbuf -oL {iperf_cmd} >> {log_path} 2>&1 &\""
-  )
+  wait = f"python3 -c 'import time; time.sleep(max(0, {start_at!r} - time.time())); print(\"start\", repr(time.time()), flush=True)'"
+  return f"{wait} && stdbuf -oL {iperf_cmd} 2>&1"
 
+def launch_iperf(job_id, entry, start_at=None):
+  """
+  Avvia il client sull'host sorgente e un thread che ne legge l'output: {} oppure {'error': ...}
+  """
   try:
-    result = subprocess.run(
-      ssh_cmd,
-      shell=True,
-      capture_output=True,
-      text=True,
-      timeout=5
-    )
-  
-    if result.returncode != 0:
-      print(f"[ERROR] SSH command failed: {result.stderr}")
-      return jsonify({
-        'error': 'Failed to start iperf',
-        'details': result.stderr
-      }), 500
-    
+    process = ssh_pool.stream(entry['src_ip'], iperf_command(entry, start_at))
+  except Exception as e:
+    print(f"[ERROR] Failed to start iperf on {entry['src_ip']}: {str(e)}")
+    stream_hub.close(job_id, entry['sender'], None)
+    return {'error': str(e)}
+
+  threading.Thread(target=read_iperf_output, args=(job_id, entry, process), daemon=True).start()
+  return {}
+
+def read_iperf_output(job_id, entry, process):
+  """
+  Copia l'output del client nel file di log e pubblica ogni report sullo stream del job
+  """
+  sender = entry['sender']
+  try:
+    os.makedirs(os.path.dirname(entry['log_path']), exist_ok=True)
+    with open(entry['log_path'], 'a') as log:
+      for line in process.stdout:
+        if line.startswith('start '):
+          started_at = float(line.split()[1])
+          with open(entry['log_path'] + '.start', 'w') as file:
+            file.write(f'{started_at!r}\n')
+          stream_hub.publish(job_id, sender, 'start', {'started_at': started_at})
+          continue
+
+        log.write(line)
+        log.flush()
+        record = parse_iperf_line(line)
+        if record is not None:
+          stream_hub.publish(job_id, sender, 'sample' if stream_hub.is_sample(record) else 'summary', record)
+  except Exception as e:
+    print(f"[ERROR] Reading iperf output of {sender}: {str(e)}")
+  finally:
+    stream_hub.close(job_id, sender, process.wait())
+
+def run_remote(host, command, ok_codes=(0,)):
+  """
+  Esegue command su host attraverso il pool: {'exit_status': codice di uscita, 'stderr': ...}
+  oppure {'exit_status': None, 'error': ...} se il comando non e' stato eseguito
+  """
+  try:
+    result = ssh_pool.run(host, command, timeout=SSH_COMMAND_TIMEOUT)
   except subprocess.TimeoutExpired:
-    print("[WARNING] SSH command timed out (this might be normal)")
+    print(f"[ERROR] SSH command timed out on {host}")
+    return {'exit_status': None, 'error': f'Timeout on {host}'}
+  except ConnectionError as e:
+    print(f"[ERROR] {str(e)}")
+    return {'exit_status': None, 'error': str(e)}
   except Exception as e:
     print(f"[ERROR] Exception: {str(e)}")
-    return jsonify({'error': str(e)}), 500
+    return {'exit_status': None, 'error': str(e)}
+
+  if result.returncode not in ok_codes:
+    print(f"[ERROR] SSH command failed on {host}: {result.stderr}")
+  return {'exit_status': result.returncode, 'stderr': result.stderr}
+
+def sender_summary(entry):
+  return {
+    'source': entry['src_ip'],
+    'destination': entry['dst_ip'],
+    'protocol': entry['proto'],
+    'rate': entry['rate'],
+    'duration': entry['duration'],
+    'log_file': entry['log_path']
+  }
+
+# --- JOB ---
+def start_iperf_job(job_id, entry):
+  # Il job termina quando il client e' lanciato; l'output arriva poi su /jobs/<id>/stream
+  stream_hub.open(job_id, [entry['sender']])
+  result = dict(sender_summary(entry), **launch_iperf(job_id, entry), stream_url=f'/jobs/{job_id}/stream')
+  return 'error' not in result, result
+
+def start_iperf_batch_job(job_id, entries, received, start_at):
+  stream_hub.open(job_id, [entry['sender'] for entry in entries])
 
+  def launch(entry):
+    result = launch_iperf(job_id, entry, start_at)
+    launched = time.time()
+    return dict(sender_summary(entry), **result, launch_latency=launched - received, start_slack=start_at - launched)
+
+  results = list(batch_executor.map(launch, entries))
+  failed = sum(1 for result in results if 'error' in result)
+  late = sum(1 for result in results if result['start_slack'] < 0)
+  if late:
+    print(f"[WARNING] {late} client lanciati dopo l'istante di partenza: aumentare start_delay")
+
+  latencies = [result['launch_latency'] for result in results]
+  return not failed, {
+    'start_at': start_at,
+    'launch_skew': max(latencies) - min(latencies),
+    'late': late,
+    'failed': failed,
+    'senders': results,
+    'stream_url': f'/jobs/{job_id}/stream'
+  }
+
+def stop_iperf_job(job_id, src_ip):
+  # pkill esce con 1 se non ci sono client da fermare: non e' un errore.
+  # [i]perf: il pattern non corrisponde alla riga di comando della shell che esegue pkill
+  result = dict(run_remote(src_ip, 'pkill -f "[i]perf -c"', ok_codes=(0, 1)), host=src_ip)
+  return result['exit_status'] in (0, 1), result
+
+def submit_job(kind, fn, *args, output=None):
+  """
+  Risposta 202 con l'id del job, da seguire su /jobs/<id>
+  """
+  try:
+    job = job_manager.submit(kind, fn, *args, output=output)
+  except QueueFull as e:
+    return jsonify({'error': f'Troppi job in coda: {str(e)}'}), 503
   return jsonify({
-    'status': 'Traffic started',
-    'source': src_ip,
-    'destination': dst_ip,
-    'protocol': l4_proto,
-    'rate': src_rate,
-    'log_file': log_path
-  })
+    'job_id': job['id'],
+    'state': job['state'],
+    'status_url': f"/jobs/{job['id']}",
+    'output': output
+  }), 202
+
+# --- END POINT ---
+@app.route('/start_iperf', methods=['POST'])
+def start_iperf():
+  data = request.json
+  entry, error = parse_iperf_entry(data, data.get('RUNTIME_OUTPUT_DIR'))
+  if error:
+    return jsonify({'error': error}), 400
 
+  os.makedirs('data', exist_ok=True)
+  return submit_job('start_iperf', start_iperf_job, entry, output=entry['log_path'])
+
+@app.route('/start_iperf_batch', methods=['POST'])
+def start_iperf_batch():
+  """
+  Avvia insieme piu' client: {'RUNTIME_OUTPUT_DIR': ..., 'start_delay': secondi, 'senders': [
+  {'IP_SRC', 'IP_DEST', 'SRC_NAME', 'DST_NAME', 'L4_proto', 'src_rate', 'duration'}, ...]}.
+  I comandi partono in parallelo e tutti i client iniziano a start_at = arrivo della richiesta
+  + start_delay. Il risultato del job riporta per ogni client la latenza di lancio e il margine
+  rispetto a start_at (negativo: il client e' partito in ritardo)
+  """
+  received = time.time()
+  data = request.json
+  out_dir = data.get('RUNTIME_OUTPUT_DIR')
+  senders = data.get('senders') or []
+  try:
+    start_delay = float(data.get('start_delay', BATCH_START_DELAY))
+  except (TypeError, ValueError):
+    start_delay = None
+  if start_delay is None or not math.isfinite(start_delay) or start_delay < 0:
+    return jsonify({'error': 'start_delay non valido'}), 400
+
+  entries = []
+  for sender in senders:
+    entry, error = parse_iperf_entry(sender, out_dir)
+    if error:
+      return jsonify({'error': error, 'sender': sender}), 400
+    entries.append(entry)
+  if not entries:
+    return jsonify({'error': 'senders vuoto'}), 400
+
+  os.makedirs('data', exist_ok=True)
+  start_at = received + start_delay
+  return submit_job('start_iperf_batch', start_iperf_batch_job, entries, received, start_at, output=[entry['log_path'] for entry in entries])
 
 @app.route('/stop_iperf', methods=['POST'])
 def stop_iperf():
@@ -83,31 +277,60 @@ def stop_iperf():
   if not src_ip:
     return jsonify({'error': 'IP_SRC required'}), 400
 
+  return submit_job('stop_iperf', stop_iperf_job, src_ip)
 
-  ssh_cmd = (
-    f"ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null "
-    f"-o LogLevel=ERROR root@{src_ip} "
-    f"'pkill -f \"iperf -c\"'"
-  )
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+  job = job_manager.get(job_id)
+  if job is None:
+    return jsonify({'error': 'Job non trovato'}), 404
 
-  try:
-    result = subprocess.run(
-      ssh_cmd,
-      shell=True,
-      capture_output=True,
-      text=True,
-      timeout=5
-    )
-    
-    return jsonify({
-      'status': 'Stopped iperf clients',
-      'host': src_ip
-    })
-    
-  except Exception as e:
-    print(f"[ERROR] Failed to stop iperf: {str(e)}")
-    return jsonify({'error': str(e)}), 500
+  # Per i job che avviano client: stato dei client, aggregati e, a client terminati, il codice di uscita
+  stream = stream_hub.summary(job_id)
+  if stream is not None:
+    job['stream'] = stream
+    if stream['state'] == 'finished' and job['exit_status'] is None:
+      codes = [totals['exit_status'] for totals in stream['aggregates'].values()]
+      job['exit_status'] = next((code for code in codes if code != 0), 0)
+  return jsonify(job)
 
-if __name__ == '__main__':
-  app.run(host='0.0.0.0', port=80, debug=True)
+@app.route('/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+  """
+  Server-Sent Events con i report dei client del job: eventi start, sample (un intervallo),
+  summary (riepilogo finale di iperf) e, quando tutti i client sono terminati, end con gli aggregati.
+  Da riprendere con Last-Event-ID (o ?from=) dopo una disconnessione
+  """
+  if not stream_hub.has(job_id):
+    return jsonify({'error': 'Stream non trovato'}), 404
+  cursor = int(request.headers.get('Last-Event-ID', -1)) + 1 if 'Last-Event-ID' in request.headers else int(request.args.get('from', 0))
 
+  def generate(cursor):
+    while True:
+      events, cursor, finished = stream_hub.wait(job_id, cursor, STREAM_KEEPALIVE)
+      for index, event in events:
+        yield f"id: {index}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+      if finished:
+        yield f"event: end\ndata: {json.dumps(stream_hub.summary(job_id))}\n\n"
+        return
+      if not events:
+        yield ': keepalive\n\n'
+
+  return Response(generate(cursor), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs', methods=['GET'])
+def jobs_stats():
+  return jsonify(job_manager.stats())
+
+@app.route('/ssh_pool', methods=['GET'])
+def ssh_pool_stats():
+  return jsonify(ssh_pool.stats())
+
+if __name__ == '__main__':
+  # Server multi-thread senza reloader: i job e il pool SSH vivono in un solo processo.
+  # waitress se installato, altrimenti il server di Werkzeug con un thread per richiesta
+  try:
+    from waitress import serve
+    serve(app, host='0.0.0.0', port=80, threads=SERVER_THREADS)
+  except ImportError:
+    app.run(host='0.0.0.0', port=80, threaded=True)
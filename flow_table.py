@@ -0,0 +1,126 @@
+def actions_key(actions):
+  # Le azioni di Ryu non sono confrontabili direttamente: si confrontano tipo e campi
+  return tuple((type(action).__name__, tuple(vars(action).items())) for action in actions)
+
+class ShadowFlowTable:
+  """
+  Copia delle regole installate in modo reattivo su ogni switch: (dpid, ip_dst) -> azioni, cookie
+  e scadenza dell'hard timeout. La scadenza per inattivita' non e' prevedibile dal controller:
+  le regole sono installate con OFPFF_SEND_FLOW_REM e vengono tolte quando arriva il FlowRemoved
+  con lo stesso cookie (un FlowRemoved di una regola gia' sostituita viene ignorato).
+
+  L'idle timeout e' per destinazione: raddoppia quando le regole vengono reinstallate entro un
+  idle timeout dalla scadenza per inattivita' (la destinazione e' ancora usata) e si dimezza
+  quando la reinstallazione arriva dopo oltre shrink_factor idle timeout
+  """
+
+  def __init__(self, idle_timeout=5, hard_timeout=15, min_idle_timeout=2, max_idle_timeout=15,
+               shrink_factor=4, margin=0.5):
+    self.default_idle_timeout = idle_timeout
+    self.hard_timeout = hard_timeout
+    self.min_idle_timeout = min_idle_timeout
+    self.max_idle_timeout = max_idle_timeout
+    self.shrink_factor = shrink_factor
+    # Una regola a meno di margin secondi dall'hard timeout viene considerata gia' scaduta
+    self.margin = margin
+
+    self.entries = {}        # (dpid, ip_dst) -> {'actions', 'cookie', 'expires'}
+    self.idle_timeouts = {}  # ip_dst -> idle timeout corrente
+    self.idle_removed = {}   # ip_dst -> istante dell'ultima scadenza per inattivita'
+    self.next_cookie = 1
+
+    self.counters = {
+      'added': 0,
+      'suppressed': 0,      # FlowMod non inviate perche' la regola identica era gia' installata
+      'removed_idle': 0,
+      'removed_hard': 0,
+      'removed_other': 0,
+      'stale_removed': 0,   # FlowRemoved di regole gia' sostituite
+      'invalidated': 0,     # regole date per installate ma smentite da un packet-in
+      'idle_timeout_up': 0,
+      'idle_timeout_down': 0
+    }
+
+  def idle_timeout(self, ip_dst):
+    return self.idle_timeouts.get(ip_dst, self.default_idle_timeout)
+
+  def is_installed(self, dpid, ip_dst, actions, now):
+    entry = self.entries.get((dpid, ip_dst))
+    if entry is None or now >= entry['expires'] - self.margin:
+      return False
+    return entry['actions'] == actions_key(actions)
+
+  def suppress(self, dpid, ip_dst, actions, now):
+    # True se la FlowMod non serve (e viene contata come risparmiata)
+    if self.is_installed(dpid, ip_dst, actions, now):
+      self.counters['suppressed'] += 1
+      return True
+    return False
+
+  def add(self, dpid, ip_dst, actions, now):
+    """
+    Registra una regola inviata con OFPFC_ADD; restituisce (cookie, idle timeout) da usare nella FlowMod
+    """
+    removed = self.idle_removed.pop(ip_dst, None)
+    if removed is not None:
+      self.adapt_idle_timeout(ip_dst, now - removed)
+
+    cookie = self.next_cookie
+    self.next_cookie += 1
+    # hard_timeout 0: la regola scade solo per inattivita' (FlowRemoved)
+    expires = now + self.hard_timeout if self.hard_timeout else float('inf')
+    self.entries[(dpid, ip_dst)] = {'actions': actions_key(actions), 'cookie': cookie, 'expires': expires}
+    self.counters['added'] += 1
+    return cookie, self.idle_timeout(ip_dst)
+
+  def modify(self, dpid, ip_dst, actions):
+    # OFPFC_MODIFY_STRICT cambia solo le azioni: cookie e timeout restano quelli della regola
+    entry = self.entries.get((dpid, ip_dst))
+    if entry is not None:
+      entry['actions'] = actions_key(actions)
+
+  def adapt_idle_timeout(self, ip_dst, gap):
+    timeout = self.idle_timeout(ip_dst)
+    if gap < timeout and timeout < self.max_idle_timeout:
+      self.idle_timeouts[ip_dst] = min(self.max_idle_timeout, timeout * 2)
+      self.counters['idle_timeout_up'] += 1
+    elif gap > self.shrink_factor * timeout and timeout > self.min_idle_timeout:
+      self.idle_timeouts[ip_dst] = max(self.min_idle_timeout, timeout / 2)
+      self.counters['idle_timeout_down'] += 1
+
+  def invalidate(self, dpid, ip_dst):
+    # Un packet-in da dpid per ip_dst: lo switch non ha (piu') la regola
+    if self.entries.pop((dpid, ip_dst), None) is not None:
+      self.counters['invalidated'] += 1
+
+  def flow_removed(self, dpid, ip_dst, cookie, reason, now):
+    """
+    reason: 'idle', 'hard' o altro (delete, eviction...). Restituisce False se il FlowRemoved
+    riguarda una regola non piu' in tabella
+    """
+    entry = self.entries.get((dpid, ip_dst))
+    if entry is None or entry['cookie'] != cookie:
+      self.counters['stale_removed'] += 1
+      return False
+
+    del self.entries[(dpid, ip_dst)]
+    if reason == 'idle':
+      self.idle_removed[ip_dst] = now
+      self.counters['removed_idle'] += 1
+    elif reason == 'hard':
+      self.counters['removed_hard'] += 1
+    else:
+      self.counters['removed_other'] += 1
+    return True
+
+  def forget_switch(self, dpid):
+    # Switch (ri)connesso: la sua tabella e' vuota
+    for key in [key for key in self.entries if key[0] == dpid]:
+      del self.entries[key]
+
+  def prune(self, now):
+    # Regole oltre l'hard timeout di cui non e' arrivato il FlowRemoved
+    self.entries = {key: entry for key, entry in self.entries.items() if entry['expires'] > now}
+
+  def stats(self):
+    return dict(self.counters, entries=len(self.entries))
@@ -0,0 +1,151 @@
+import threading
+import time
+
+# Output CSV di iperf (-y C): timestamp, ip sorgente, porta, ip destinazione, porta, id, intervallo,
+# byte trasferiti, bit/s. Il report del server UDP aggiunge jitter (ms), pacchetti persi, totali,
+# percentuale di perdita e fuori ordine (lo stesso formato letto da print_throughput.py)
+
+def parse_iperf_line(line):
+  """
+  Riga CSV di iperf -> dict, None se la riga non e' un report
+  """
+  fields = line.strip().split(',')
+  if len(fields) < 9: return None
+  try:
+    start, end = (float(value) for value in fields[6].split('-'))
+    record = {
+      'timestamp': fields[0],
+      'source': f'{fields[1]}:{fields[2]}',
+      'destination': f'{fields[3]}:{fields[4]}',
+      'start': start,
+      'end': end,
+      'bytes': int(fields[7]),
+      'bps': float(fields[8])
+    }
+    if len(fields) >= 14:
+      record.update(
+        jitter_ms=float(fields[9]),
+        lost=int(fields[10]),
+        total=int(fields[11]),
+        loss_pct=float(fields[12]),
+        out_of_order=int(fields[13])
+      )
+  except ValueError:
+    return None
+  return record
+
+class StreamHub:
+  """
+  Eventi dei client iperf di ogni job, in memoria, con aggregati per client aggiornati a ogni
+  campione. Gli eventi sono numerati: chi segue lo stream chiede quelli successivi all'ultimo
+  ricevuto e resta in attesa finche' ne arrivano di nuovi o tutti i client del job sono terminati.
+  Ogni stream tiene al massimo max_events eventi; gli stream finiti vengono dimenticati dopo retention secondi
+  """
+
+  def __init__(self, interval, max_events=10000, retention=600):
+    # I report che coprono piu' di un intervallo sono i riepiloghi finali di iperf
+    self.interval = interval
+    self.max_events = max_events
+    self.retention = retention
+    self.condition = threading.Condition()
+    self.streams = {}  # job id -> stream
+
+  def open(self, job_id, senders):
+    with self.condition:
+      self.prune()
+      self.streams[job_id] = {
+        'events': [],
+        'first': 0,          # numero del primo evento ancora in memoria
+        'running': set(senders),
+        'finished': None,
+        'aggregates': {sender: {'samples': 0, 'bytes': 0, 'seconds': 0, 'last_bps': None, 'min_bps': None, 'max_bps': None, 'exit_status': None} for sender in senders}
+      }
+
+  def publish(self, job_id, sender, kind, data):
+    with self.condition:
+      stream = self.streams.get(job_id)
+      if stream is None: return
+      event = dict(data, type=kind, sender=sender)
+      if kind == 'sample':
+        self.aggregate(stream['aggregates'][sender], event)
+      elif kind == 'summary':
+        totals = stream['aggregates'][sender]
+        totals['summary'] = event
+        # Jitter e perdita arrivano solo nel report finale del server UDP
+        for key in ('jitter_ms', 'loss_pct'):
+          if key in event:
+            totals[key] = event[key]
+      elif kind == 'start':
+        stream['aggregates'][sender]['started_at'] = event['started_at']
+
+      stream['events'].append(event)
+      if len(stream['events']) > self.max_events:
+        del stream['events'][0]
+        stream['first'] += 1
+      self.condition.notify_all()
+
+  def aggregate(self, totals, record):
+    totals['samples'] += 1
+    totals['bytes'] += record['bytes']
+    totals['seconds'] += record['end'] - record['start']
+    totals['mean_bps'] = totals['bytes'] * 8 / totals['seconds'] if totals['seconds'] else 0
+    totals['last_bps'] = record['bps']
+    totals['min_bps'] = record['bps'] if totals['min_bps'] is None else min(totals['min_bps'], record['bps'])
+    totals['max_bps'] = record['bps'] if totals['max_bps'] is None else max(totals['max_bps'], record['bps'])
+    for key in ('jitter_ms', 'loss_pct'):
+      if key in record:
+        totals[key] = record[key]
+
+  def is_sample(self, record):
+    return record['end'] - record['start'] <= 1.5 * self.interval
+
+  def close(self, job_id, sender, exit_status):
+    with self.condition:
+      stream = self.streams.get(job_id)
+      if stream is None: return
+      stream['aggregates'][sender]['exit_status'] = exit_status
+      stream['running'].discard(sender)
+      if not stream['running']:
+        stream['finished'] = time.time()
+      self.condition.notify_all()
+
+  def wait(self, job_id, cursor, timeout):
+    """
+    Eventi dal numero cursor in poi: ([(numero, evento)], nuovo cursor, stream finito).
+    Se non ce ne sono aspetta al massimo timeout secondi
+    """
+    with self.condition:
+      stream = self.streams.get(job_id)
+      if stream is None:
+        return [], cursor, True
+      end = lambda: stream['first'] + len(stream['events'])
+      if cursor >= end() and stream['finished'] is None:
+        self.condition.wait(timeout)
+      # Eventi gia' scartati: si riparte dal primo disponibile
+      cursor = max(cursor, stream['first'])
+      events = list(enumerate(stream['events'][cursor - stream['first']:], cursor))
+      return events, end(), stream['finished'] is not None and cursor + len(events) >= end()
+
+  def has(self, job_id):
+    with self.condition:
+      return job_id in self.streams
+
+  def summary(self, job_id):
+    with self.condition:
+      stream = self.streams.get(job_id)
+      if stream is None: return None
+      starts = [totals['started_at'] for totals in stream['aggregates'].values() if 'started_at' in totals]
+      return {
+        'state': 'finished' if stream['finished'] is not None else 'running',
+        'running': sorted(stream['running']),
+        'events': stream['first'] + len(stream['events']),
+        # Differenza tra la prima e l'ultima partenza effettiva dei client
+        'start_skew': max(starts) - min(starts) if starts else None,
+        'aggregates': {sender: dict(totals) for sender, totals in stream['aggregates'].items()}
+      }
+
+  def prune(self):
+    # Chiamata con il lock gia' preso
+    deadline = time.time() - self.retention
+    for job_id in [job_id for job_id, stream in self.streams.items() if stream['finished'] is not None and stream['finished'] < deadline]:
+      del self.streams[job_id]
@@ -0,0 +1,82 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+class QueueFull(Exception):
+  pass
+
+class JobManager:
+  """
+  Operazioni sul traffico eseguite in background: submit() restituisce subito il job,
+  al massimo max_workers job girano insieme e al massimo max_queued aspettano un worker.
+  Un job e' una funzione che riceve l'id del job seguito dagli argomenti e restituisce
+  (ok, risultato); lo stato passa da queued a running
+  e poi a succeeded o failed. I job finiti da oltre retention secondi vengono dimenticati
+  """
+
+  def __init__(self, max_workers=16, max_queued=256, retention=600):
+    self.executor = ThreadPoolExecutor(max_workers=max_workers)
+    self.max_queued = max_queued
+    self.retention = retention
+    self.lock = threading.Lock()
+    self.jobs = {}  # id -> job
+
+  def submit(self, kind, fn, *args, output=None):
+    with self.lock:
+      self.prune()
+      queued = sum(1 for job in self.jobs.values() if job['state'] == 'queued')
+      if queued >= self.max_queued:
+        raise QueueFull(f'{queued} job in coda')
+
+      job = {
+        'id': uuid.uuid4().hex[:12],
+        'kind': kind,
+        'state': 'queued',
+        'created': time.time(),
+        'started': None,
+        'finished': None,
+        'exit_status': None,
+        'output': output,
+        'result': None,
+        'error': None
+      }
+      self.jobs[job['id']] = job
+      snapshot = dict(job)
+    self.executor.submit(self._run, job, fn, args)
+    return snapshot
+
+  def _run(self, job, fn, args):
+    with self.lock:
+      job['state'] = 'running'
+      job['started'] = time.time()
+    try:
+      ok, result = fn(job['id'], *args)
+      error = result.get('error') if isinstance(result, dict) else None
+    except Exception as e:
+      ok, result, error = False, None, str(e)
+    with self.lock:
+      job['state'] = 'succeeded' if ok else 'failed'
+      job['finished'] = time.time()
+      job['result'] = result
+      job['error'] = error
+      if isinstance(result, dict):
+        job['exit_status'] = result.get('exit_status')
+
+  def get(self, job_id):
+    with self.lock:
+      job = self.jobs.get(job_id)
+      return dict(job) if job is not None else None
+
+  def prune(self):
+    # Chiamata con il lock gia' preso
+    deadline = time.time() - self.retention
+    for job_id in [job_id for job_id, job in self.jobs.items() if job['finished'] is not None and job['finished'] < deadline]:
+      del self.jobs[job_id]
+
+  def stats(self):
+    with self.lock:
+      counts = {'queued': 0, 'running': 0, 'succeeded': 0, 'failed': 0}
+      for job in self.jobs.values():
+        counts[job['state']] += 1
+    return counts
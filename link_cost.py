@@ -0,0 +1,85 @@
+# Stimatori del costo dei link a partire dalle OFPPortStats.
+# Ogni stimatore ha un metodo update(key, stat): riceve la statistica di una porta, key = (dpid, porta),
+# e restituisce il nuovo peso del link in uscita da quella porta, oppure None se il peso pubblicato
+# non deve cambiare. make_estimator() crea lo stimatore registrato in ESTIMATORS con quel nome.
+
+BASE_COST = 10
+
+class DeltaBytesEstimator:
+  """
+  Stimatore originale: 10 + byte (tx + rx) trasferiti tra due risposte, in MiB.
+  Non tiene conto del tempo trascorso tra le risposte
+  """
+
+  def __init__(self, base_cost=BASE_COST):
+    self.base_cost = base_cost
+    self.port_stats = {}
+
+  def update(self, key, stat):
+    current_bytes = stat.tx_bytes + stat.rx_bytes
+    prev_bytes = self.port_stats.get(key, current_bytes)
+    self.port_stats[key] = current_bytes
+
+    delta_bytes = current_bytes - prev_bytes
+    return self.base_cost + delta_bytes / (1024*1024)
+
+class RateEstimator:
+  """
+  Rate in trasmissione della porta calcolato sui timestamp dello switch (duration_sec/nsec),
+  normalizzato sulla capacita' del link, lisciato con una EWMA e pubblicato solo
+  quando si sposta di oltre `hysteresis` (relativo) dall'ultimo peso pubblicato.
+  Costo: base_cost + utilization_cost * utilizzo (0..1)
+  """
+
+  def __init__(self, base_cost=BASE_COST, utilization_cost=100, alpha=0.3, hysteresis=0.1,
+               capacity_bps=1e9, port_capacity=None):
+    self.base_cost = base_cost
+    self.utilization_cost = utilization_cost
+    self.alpha = alpha
+    self.hysteresis = hysteresis
+    self.capacity_bps = capacity_bps
+    self.port_capacity = port_capacity if port_capacity is not None else {}
+
+    self.samples = {}      # (dpid, porta) -> (istante switch, tx_bytes)
+    self.utilization = {}  # (dpid, porta) -> utilizzo lisciato
+    self.published = {}    # (dpid, porta) -> ultimo peso pubblicato
+
+  def update(self, key, stat):
+    now = stat.duration_sec + stat.duration_nsec / 1e9
+    prev = self.samples.get(key)
+    self.samples[key] = (now, stat.tx_bytes)
+
+    if prev is None:
+      return self._publish(key, self.base_cost)
+
+    elapsed = now - prev[0]
+    delta_bytes = stat.tx_bytes - prev[1]
+    # Risposta duplicata o contatori azzerati (porta ricreata): nessun campione valido
+    if elapsed <= 0 or delta_bytes < 0:
+      return None
+
+    capacity = self.port_capacity.get(key, self.capacity_bps)
+    utilization = min(delta_bytes * 8 / elapsed / capacity, 1.0)
+
+    smoothed = self.utilization.get(key)
+    smoothed = utilization if smoothed is None else self.alpha * utilization + (1 - self.alpha) * smoothed
+    self.utilization[key] = smoothed
+
+    return self._publish(key, self.base_cost + self.utilization_cost * smoothed)
+
+  def _publish(self, key, weight):
+    last = self.published.get(key)
+    if last is not None and abs(weight - last) <= self.hysteresis * last:
+      return None
+    self.published[key] = weight
+    return weight
+
+ESTIMATORS = {
+  'bytes': DeltaBytesEstimator,
+  'rate': RateEstimator
+}
+
+def make_estimator(name, **params):
+  if name not in ESTIMATORS:
+    raise RuntimeError('Unknown link cost estimator "{}"'.format(name))
+  return ESTIMATORS[name](**params)
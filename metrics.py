@@ -0,0 +1,107 @@
+from bisect import bisect_left
+
+from ryu.app.wsgi import ControllerBase, Response, route
+
+# Limiti superiori dei bucket (secondi): da 100us a 2.5s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+METRICS_INSTANCE = 'metrics'
+
+class Histogram:
+  def __init__(self, buckets=DEFAULT_BUCKETS):
+    self.buckets = tuple(buckets)
+    self.counts = [0] * (len(self.buckets) + 1) # l'ultimo conta i valori oltre l'ultimo limite
+    self.sum = 0
+    self.count = 0
+
+  def observe(self, value):
+    self.counts[bisect_left(self.buckets, value)] += 1
+    self.sum += value
+    self.count += 1
+
+class Metrics:
+  """
+  Contatori e istogrammi di latenza del controller, esportati nel formato testuale di Prometheus.
+  I collector sono funzioni che restituiscono un dict {chiave: valore} (per esempio install_stats),
+  letto solo quando viene chiesto /metrics
+  """
+
+  def __init__(self, prefix='l3router'):
+    self.prefix = prefix
+    self.counters = {}    # (nome, etichette) -> valore
+    self.gauges = {}      # (nome, etichette) -> valore corrente
+    self.histograms = {}  # (nome, etichette) -> Histogram
+    self.collectors = []  # (nome, funzione)
+
+  def inc(self, name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    self.counters[key] = self.counters.get(key, 0) + value
+
+  def set(self, name, value, **labels):
+    self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+  def observe(self, name, value, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    histogram = self.histograms.get(key)
+    if histogram is None:
+      histogram = self.histograms[key] = Histogram()
+    histogram.observe(value)
+
+  def collect(self, name, fn):
+    self.collectors.append((name, fn))
+
+  def render(self):
+    lines = []
+    typed = set()
+
+    def header(name, kind):
+      if name not in typed:
+        typed.add(name)
+        lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(self.counters.items()):
+      name = f'{self.prefix}_{name}'
+      header(name, 'counter')
+      lines.append(f'{name}{format_labels(labels)} {value}')
+
+    for (name, labels), value in sorted(self.gauges.items()):
+      name = f'{self.prefix}_{name}'
+      header(name, 'gauge')
+      lines.append(f'{name}{format_labels(labels)} {value}')
+
+    for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+      name = f'{self.prefix}_{name}'
+      header(name, 'histogram')
+      bounds = [repr(float(bound)) for bound in histogram.buckets] + ['+Inf']
+      cumulative = 0
+      for bound, count in zip(bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+      lines.append(f'{name}_sum{format_labels(labels)} {histogram.sum}')
+      lines.append(f'{name}_count{format_labels(labels)} {histogram.count}')
+
+    for collector, fn in self.collectors:
+      for key, value in fn().items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)): continue
+        name = f'{self.prefix}_{collector}_{key}'
+        header(name, 'untyped')
+        lines.append(f'{name} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+def format_labels(labels):
+  if not labels: return ''
+  return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+class MetricsController(ControllerBase):
+  """
+  GET /metrics sul server WSGI di Ryu (porta --wsapi-port, default 8080)
+  """
+
+  def __init__(self, req, link, data, **config):
+    super(MetricsController, self).__init__(req, link, data, **config)
+    self.metrics = data[METRICS_INSTANCE]
+
+  @route('metrics', '/metrics', methods=['GET'])
+  def get_metrics(self, req, **kwargs):
+    return Response(content_type='text/plain', charset='utf-8', body=self.metrics.render().encode('utf-8'))
@@ -0,0 +1,68 @@
+from collections import namedtuple
+import socket
+import struct
+
+from ryu.lib.packet import packet, ethernet, ether_types, arp, ipv4
+
+# Solo i campi che _packet_in_handler usa davvero (opcode solo per ARP)
+ParsedPacket = namedtuple('ParsedPacket', ['ethertype', 'eth_src', 'src_ip', 'dst_ip', 'opcode'])
+
+_LLDP_PACKET = ParsedPacket(ether_types.ETH_TYPE_LLDP, None, None, None, None)
+
+_ETH_TYPE = struct.Struct('!H')           # offset 12
+_IPV4_ADDRS = struct.Struct('!B11x4s4s')  # offset 14: version/IHL, ..., src, dst
+_ARP_HEADER = struct.Struct('!HHBBH6s4s6s4s') # offset 14
+
+ETH_HEADER_LEN = 14
+IPV4_MIN_LEN = ETH_HEADER_LEN + 20
+ARP_LEN = ETH_HEADER_LEN + 28
+
+def parse_packet(data):
+  """
+  Classificazione veloce di un packet-in leggendo direttamente i byte del frame.
+  Restituisce None quando il frame non e' Ethernet II + IPv4/ARP ben formato
+  (VLAN, ARP non IPv4, frame troncati...): in quel caso serve parse_packet_full
+  """
+  if len(data) < ETH_HEADER_LEN:
+    return None
+
+  view = memoryview(data)
+  ethertype, = _ETH_TYPE.unpack_from(view, 12)
+
+  if ethertype == ether_types.ETH_TYPE_LLDP:
+    return _LLDP_PACKET
+
+  if ethertype == ether_types.ETH_TYPE_IP:
+    if len(data) < IPV4_MIN_LEN: return None
+    version_ihl, src, dst = _IPV4_ADDRS.unpack_from(view, ETH_HEADER_LEN)
+    if version_ihl >> 4 != 4: return None
+    return ParsedPacket(ethertype, view[6:12].hex(':'), socket.inet_ntoa(src), socket.inet_ntoa(dst), None)
+
+  if ethertype == ether_types.ETH_TYPE_ARP:
+    if len(data) < ARP_LEN: return None
+    hwtype, proto, hlen, plen, opcode, _, src_ip, _, dst_ip = _ARP_HEADER.unpack_from(view, ETH_HEADER_LEN)
+    if hwtype != 1 or proto != ether_types.ETH_TYPE_IP or hlen != 6 or plen != 4: return None
+    return ParsedPacket(ethertype, view[6:12].hex(':'), socket.inet_ntoa(src_ip), socket.inet_ntoa(dst_ip), opcode)
+
+  return None
+
+def parse_packet_full(data):
+  """
+  Stessi campi di parse_packet ottenuti con il parser generico di Ryu
+  """
+  pkt = packet.Packet(data)
+  eth = pkt.get_protocol(ethernet.ethernet)
+  if eth is None:
+    return None
+
+  if eth.ethertype == ether_types.ETH_TYPE_ARP:
+    a = pkt.get_protocol(arp.arp)
+    if a is None: return None
+    return ParsedPacket(eth.ethertype, eth.src, a.src_ip, a.dst_ip, a.opcode)
+
+  if eth.ethertype == ether_types.ETH_TYPE_IP:
+    ip_pkt = pkt.get_protocol(ipv4.ipv4)
+    if ip_pkt is None: return None
+    return ParsedPacket(eth.ethertype, eth.src, ip_pkt.src, ip_pkt.dst, None)
+
+  return ParsedPacket(eth.ethertype, eth.src, None, None, None)
@@ -0,0 +1,88 @@
+from collections import deque
+
+from eventlet import tpool
+from ryu.lib import hub
+
+class PathWorkerPool:
+  """
+  Esegue i calcoli dei percorsi su thread nativi (eventlet.tpool) invece che sull'hub di Ryu:
+  mentre un thread calcola, l'hub continua a gestire packet-in, echo e statistiche.
+  Il risultato torna sull'hub tramite callback. Al massimo max_in_flight calcoli contemporanei
+  (gli altri restano in coda) e le richieste uguali ancora in corso vengono accorpate.
+  Il numero di thread nativi e' quello di eventlet (EVENTLET_THREADPOOL_SIZE, default 20)
+  """
+
+  def __init__(self, engine, algorithm='dijkstra', max_in_flight=4):
+    self.engine = engine
+    self.algorithm = algorithm
+    self.max_in_flight = max_in_flight
+
+    self.queue = deque()  # (fn, args, callback) in attesa di un posto
+    self.in_flight = 0
+    self.waiting = {}     # (src, dst, timbro dei pesi) -> [callback]
+
+    self.submitted = 0
+    self.completed = 0
+    self.coalesced = 0
+    self.errors = 0
+
+  def submit(self, fn, args, callback):
+    """
+    Esegue fn(*args) su un thread nativo e poi callback(risultato) sull'hub
+    (callback(None) se fn solleva un'eccezione)
+    """
+    self.submitted += 1
+    self.queue.append((fn, args, callback))
+    self._start_next()
+
+  def request_path(self, src, dst, callback):
+    """
+    Calcola il percorso src -> dst con self.algorithm e chiama callback(path) sull'hub
+    """
+    # Il grafo viene copiato sull'hub: il thread lavora su pesi coerenti anche se nel frattempo
+    # arrivano nuove statistiche
+    engine = self.engine
+    key = (src, dst, engine.version, engine.weight_changes)
+    if key in self.waiting:
+      self.waiting[key].append(callback)
+      self.coalesced += 1
+      return
+
+    self.waiting[key] = [callback]
+    # Le tabelle dei landmark si calcolano sull'hub: la copia le eredita e il thread non le ricalcola
+    if self.algorithm == 'astar':
+      engine.ensure_landmarks()
+    self.submit(self._search, (engine.snapshot(), src, dst), lambda path: self._deliver(key, path))
+
+  def _search(self, engine, src, dst):
+    return getattr(engine, self.algorithm)(src, dst)
+
+  def _deliver(self, key, path):
+    for callback in self.waiting.pop(key, []):
+      callback(path)
+
+  def _start_next(self):
+    while self.queue and self.in_flight < self.max_in_flight:
+      self.in_flight += 1
+      hub.spawn(self._run, *self.queue.popleft())
+
+  def _run(self, fn, args, callback):
+    try:
+      result = tpool.execute(fn, *args)
+    except Exception:
+      self.errors += 1
+      result = None
+    self.in_flight -= 1
+    self.completed += 1
+    self._start_next()
+    callback(result)
+
+  def stats(self):
+    return {
+      'submitted': self.submitted,
+      'completed': self.completed,
+      'coalesced': self.coalesced,
+      'queued': len(self.queue),
+      'in_flight': self.in_flight,
+      'errors': self.errors
+    }
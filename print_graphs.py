@@ -1,7 +1,8 @@
 import raylib as rl
 import math
 from dataclasses import dataclass
-import json
+from telemetry import load_frames
+from topology_spec import load_topology, plot_layout, SPACING
 
 font = None
 ALGORITHM = 'astar'
@@ -85,7 +86,11 @@ def update():
     rl.TakeScreenshot(f'{ALGORITHM}_graphs_plots.png'.encode())
 
 def draw_graph(graph: Graph, rec: Rect):
-  topo_size = vec2(16, 10)
+  # Area occupata dalla topologia con un margine
+  topo_size = vec2(
+    max(pos.x for pos in graph.nodes.values()) + SPACING,
+    max(pos.y for pos in graph.nodes.values()) + SPACING
+  )
   
   col = color(150, 150, 150)
   size = vec2(rec.width, rec.height)
@@ -152,38 +157,14 @@ def draw_graphs(graphs: list[Graph]):
 def load_graphs() -> list[Graph]:
   graphs: list[Graph] = []
 
-  frames: list[dict] = []
-  with open(f'{ALGORITHM}_weighted_paths.json') as file:
-    frames = json.load(file)
+  frames: list[dict] = load_frames(ALGORITHM)
+  # Host numerati da 1, switch con dpid + numero di host (come nella telemetria del controller)
+  nodes, edges = plot_layout(load_topology())
 
   for frame in frames:
     graph = Graph(
-      nodes = {
-        # ----- hosts -----
-        1: vec2(4, 2),   #h1
-        2: vec2(2, 2),   #h2
-        3: vec2(2, 8),   #h3
-        4: vec2(14, 4),  #h4
-        5: vec2(14, 8),  #h5
-
-        # ----- switches -----
-        6: vec2(6, 4),   #sw1
-        7: vec2(8, 4),   #sw2
-        8: vec2(10, 4),  #sw3
-        9: vec2(6, 6),   #sw4
-        10: vec2(8, 6),  #sw5
-        11: vec2(10, 6), #sw6
-        12: vec2(6, 8),  #sw7
-        13: vec2(8, 8),  #sw8
-        14: vec2(10, 8)  #sw9
-      },
-      edges = {
-        # ----- host-switch -----
-        (1, 6), (2, 6), (3, 12), (4, 8), (5, 14),
-        # ----- switch-switch -----
-        (6, 7), (7, 8), (9, 10), (10, 11), (12, 13), (13, 14), # horizontal
-        (6, 9), (9, 12), (7, 10), (10, 13), (8, 11), (11, 14) # vertical
-      }
+      nodes = {node: vec2(x, y) for node, (x, y) in nodes.items()},
+      edges = set(edges)
     )
 
     for weighted_edge in frame.get("weights"):
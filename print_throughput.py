@@ -1,6 +1,8 @@
 import csv
+import statistics
 import matplotlib.pyplot as plt
 from datetime import datetime
+from telemetry import load_frames
 
 def print_throughput(algo):
   with open(f'data/{algo}/h1_server_output.csv', 'r') as file:
@@ -36,5 +38,19 @@ def print_throughput(algo):
   plt.scatter(timestamp, throughput)
   plt.savefig(f'{algo}_throughput.png')
 
+  print_stability(algo, throughput)
+
+def count_path_changes(algo):
+  frames = load_frames(algo)
+  paths = [frame.get('last_path') for frame in frames if frame.get('last_path')]
+  return sum(1 for prev, curr in zip(paths, paths[1:]) if prev != curr)
+
+def print_stability(algo, throughput):
+  # Stabilita' del throughput (coefficiente di variazione) e numero di cambi di percorso,
+  # per confrontare algoritmi e stimatori del costo dei link sullo stesso traffico
+  mean = statistics.mean(throughput)
+  stdev = statistics.pstdev(throughput)
+  print(f'{algo}: throughput medio {mean:.2f} Mbit/s, dev. std {stdev:.2f}, CoV {stdev/mean if mean else 0:.3f}, cambi di percorso {count_path_changes(algo)}')
+
 print_throughput('dijkstra')
 print_throughput('astar')
\ No newline at end of file
@@ -0,0 +1,289 @@
+import json
+import os
+import random
+import signal
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+from ryu.lib.packet import packet, ethernet, ether_types, arp, ipv4, udp, lldp
+from ryu.topology import event
+
+import controller
+from telemetry import rotated_files
+from topology_spec import TOPOLOGY_PATH, load_topology, host_mac
+
+# Harness per misurare il controller senza Mininet/OVS: L3Router con datapath finti che registrano
+# i messaggi inviati, topologia iniettata con eventi sintetici, risposte alle port stats e packet-in
+# generati oppure riletti da una traccia JSON Lines (registrata dal controller con TRACE_PATH).
+# Riporta packet-in/s, percentili di latenza per tipo di evento e messaggi inviati per evento.
+#
+# La topologia e' quella di topology.json (vedi topology_spec.py), di default la griglia 3x3.
+#
+# Uso: python replay.py [numero di eventi | traccia.jsonl] [file dove salvare la traccia generata | -] [topologia.json]
+
+EVENTS = 20000
+# transit: pacchetti IPv4 da un link tra switch con un mittente non in arp_table
+MIX = {'lldp': 0.4, 'arp': 0.15, 'ipv4': 0.4, 'transit': 0.02, 'port_stats': 0.05}
+
+class FakeDatapath:
+  """
+  Datapath che conta i messaggi inviati per tipo e prepara la risposta a ogni BarrierRequest.
+  Come in Ryu, le risposte arrivano al controller solo dopo che l'handler in corso e' terminato
+  (deliver_barriers)
+  """
+
+  def __init__(self, dpid, app):
+    self.id = dpid
+    self.app = app
+    self.ofproto = ofproto_v1_3
+    self.ofproto_parser = ofproto_v1_3_parser
+    self.xid = 0
+    self.sent = Counter()
+    self.barrier_replies = []
+
+  def set_xid(self, msg):
+    self.xid += 1
+    msg.set_xid(self.xid)
+    return self.xid
+
+  def send_msg(self, msg):
+    # Come Datapath.send_msg di Ryu
+    if msg.xid is None:
+      self.set_xid(msg)
+    self.sent[type(msg).__name__] += 1
+    if isinstance(msg, ofproto_v1_3_parser.OFPBarrierRequest):
+      reply = ofproto_v1_3_parser.OFPBarrierReply(self)
+      reply.xid = msg.xid
+      self.barrier_replies.append(reply)
+
+def deliver_barriers(app):
+  # Consegna le risposte alle barrier accumulate (e quelle generate nel frattempo)
+  delivered = True
+  while delivered:
+    delivered = False
+    for dp in list(app.datapaths.values()):
+      replies, dp.barrier_replies = dp.barrier_replies, []
+      for reply in replies:
+        app._barrier_reply_handler(Event(reply))
+        delivered = True
+
+class Event:
+  def __init__(self, msg):
+    self.msg = msg
+
+def build_controller(topology_path=TOPOLOGY_PATH):
+  """
+  L3Router con la topologia descritta in topology_path, iniettata come eventi SwitchEnter/LinkAdd.
+  Restituisce il controller e gli host come {ip: (dpid, porta, mac)}
+  """
+  # Il controller scrive la telemetria in TELEMETRY_PATH: il benchmark non tocca i dati degli esperimenti
+  controller.TELEMETRY_PATH = os.path.join(tempfile.mkdtemp(), 'bench_weighted_paths.jsonl')
+  controller.TOPOLOGY_PATH = topology_path
+  controller.TOPOLOGY_PRINT = False
+  app = controller.L3Router()
+  # Il controller registra save() su SIGINT: nel benchmark non deve sovrascrivere i dati salvati
+  signal.signal(signal.SIGINT, signal.default_int_handler)
+
+  # Porte numerate nell'ordine in cui topology.py aggiunge i link: prima gli switch, poi gli host
+  spec = load_topology(topology_path)
+  next_port = defaultdict(lambda: 1)
+  link_ports = []
+  for link in spec['links']:
+    a, b = link['src'], link['dst']
+    link_ports.append((a, next_port[a], b, next_port[b]))
+    next_port[a] += 1
+    next_port[b] += 1
+
+  hosts = {}
+  for host in spec['hosts']:
+    dpid = host['switch']
+    hosts[host['ip'].split('/')[0]] = (dpid, next_port[dpid], host['mac'])
+    next_port[dpid] += 1
+
+  for dpid in sorted(switch['dpid'] for switch in spec['switches']):
+    dp = FakeDatapath(dpid, app)
+    ports = [SimpleNamespace(dpid=dpid, port_no=port_no) for port_no in range(1, next_port[dpid])]
+    app.update_topology(event.EventSwitchEnter(SimpleNamespace(dp=dp, ports=ports)))
+  for a, port_a, b, port_b in link_ports:
+    a_end = SimpleNamespace(dpid=a, port_no=port_a)
+    b_end = SimpleNamespace(dpid=b, port_no=port_b)
+    app.update_topology(event.EventLinkAdd(SimpleNamespace(src=a_end, dst=b_end)))
+    app.update_topology(event.EventLinkAdd(SimpleNamespace(src=b_end, dst=a_end)))
+  # Senza attendere il debounce
+  app.commit_topology()
+
+  return app, hosts
+
+def learn_hosts(app, hosts):
+  # Gli host in arp_table come a regime
+  for ip, (dpid, port_no, mac) in hosts.items():
+    app.learn_host(ip, dpid, port_no, mac)
+  deliver_barriers(app)
+
+# --- FRAME ---
+def lldp_frame(dpid, port_no):
+  p = packet.Packet()
+  p.add_protocol(ethernet.ethernet(dst=lldp.LLDP_MAC_NEAREST_BRIDGE, src=host_mac(dpid - 1), ethertype=ether_types.ETH_TYPE_LLDP))
+  p.add_protocol(lldp.lldp([
+    lldp.ChassisID(subtype=lldp.ChassisID.SUB_LOCALLY_ASSIGNED, chassis_id=b'dpid:%016x' % dpid),
+    lldp.PortID(subtype=lldp.PortID.SUB_PORT_COMPONENT, port_id=b'%08x' % port_no),
+    lldp.TTL(ttl=120),
+    lldp.End()
+  ]))
+  p.serialize()
+  return p.data
+
+def arp_frame(src_mac, src_ip, dst_ip):
+  p = packet.Packet()
+  p.add_protocol(ethernet.ethernet(dst='ff:ff:ff:ff:ff:ff', src=src_mac, ethertype=ether_types.ETH_TYPE_ARP))
+  p.add_protocol(arp.arp(opcode=arp.ARP_REQUEST, src_mac=src_mac, src_ip=src_ip, dst_mac='00:00:00:00:00:00', dst_ip=dst_ip))
+  p.serialize()
+  return p.data
+
+def ipv4_frame(src_mac, src_ip, dst_ip):
+  p = packet.Packet()
+  p.add_protocol(ethernet.ethernet(dst=controller.ROUTER_MAC, src=src_mac, ethertype=ether_types.ETH_TYPE_IP))
+  p.add_protocol(ipv4.ipv4(src=src_ip, dst=dst_ip, proto=17))
+  p.add_protocol(udp.udp(src_port=40000, dst_port=5001))
+  p.add_protocol(b'\x00' * 1442)
+  p.serialize()
+  return p.data
+
+# --- EVENTI ---
+# Stesso formato dei record scritti dal controller con TRACE_PATH:
+#   {"type": "packet_in", "dpid": ..., "in_port": ..., "data": frame in esadecimale}
+#   {"type": "port_stats", "dpid": ..., "stats": [[porta, rx_bytes, tx_bytes, duration_sec, duration_nsec], ...]}
+
+def generate(app, hosts, count, mix=MIX, seed=0):
+  rng = random.Random(seed)
+  ips = list(hosts)
+  ports = {dpid: sorted(ports) for dpid, ports in app.switch_ports.items()}
+  tx_bytes = defaultdict(int)
+  clock = defaultdict(int)
+
+  records = []
+  for _ in range(count):
+    kind = rng.choices(list(mix), weights=list(mix.values()))[0]
+    if kind == 'lldp':
+      dpid = rng.choice(app.switches)
+      port_no = rng.choice(list(app.adjacency[dpid].values()))
+      records.append({'type': 'packet_in', 'dpid': dpid, 'in_port': port_no, 'data': lldp_frame(dpid, port_no).hex()})
+    elif kind == 'port_stats':
+      # Un secondo dopo la risposta precedente, traffico casuale fino a ~1 Gbit/s
+      dpid = rng.choice(app.switches)
+      clock[dpid] += 1
+      stats = []
+      for port_no in ports[dpid]:
+        tx_bytes[(dpid, port_no)] += rng.randrange(125_000_000)
+        stats.append([port_no, 0, tx_bytes[(dpid, port_no)], clock[dpid], 0])
+      records.append({'type': 'port_stats', 'dpid': dpid, 'stats': stats})
+    elif kind == 'transit':
+      dpid = rng.choice(app.switches)
+      port_no = rng.choice(list(app.adjacency[dpid].values()))
+      src = f'10.255.{rng.randrange(256)}.{rng.randrange(1, 254)}'
+      records.append({'type': 'packet_in', 'dpid': dpid, 'in_port': port_no, 'data': ipv4_frame('02:00:00:00:00:01', src, rng.choice(ips)).hex()})
+    else:
+      src, dst = rng.sample(ips, 2)
+      dpid, port_no, mac = hosts[src]
+      frame = arp_frame(mac, src, '.'.join(src.split('.')[:3] + ['254'])) if kind == 'arp' else ipv4_frame(mac, src, dst)
+      records.append({'type': 'packet_in', 'dpid': dpid, 'in_port': port_no, 'data': frame.hex()})
+  return records
+
+def save_trace(records, path):
+  with open(path, 'w') as file:
+    for record in records:
+      file.write(json.dumps(record) + '\n')
+
+def load_trace(path):
+  # Una traccia registrata dal controller puo' essere stata ruotata in piu' file
+  records = []
+  for file_path in rotated_files(path):
+    with open(file_path) as file:
+      records.extend(json.loads(line) for line in file if line.strip())
+  return records
+
+def classify(data):
+  ethertype = int.from_bytes(data[12:14], 'big') if len(data) >= 14 else None
+  return {ether_types.ETH_TYPE_LLDP: 'lldp', ether_types.ETH_TYPE_ARP: 'arp', ether_types.ETH_TYPE_IP: 'ipv4'}.get(ethertype, 'other')
+
+# Campi di OFPPortStats non usati dal controller
+ZERO_PORT_STATS = {field: 0 for field in ofproto_v1_3_parser.OFPPortStats._fields}
+
+def prepare(app, records):
+  """
+  Messaggi OpenFlow pronti da consegnare: (tipo, handler, evento), costruiti prima della misura
+  """
+  parser = ofproto_v1_3_parser
+  prepared = []
+  for record in records:
+    dp = app.datapaths.get(record['dpid'])
+    if dp is None: continue
+
+    if record['type'] == 'packet_in':
+      data = bytes.fromhex(record['data'])
+      msg = parser.OFPPacketIn(dp, buffer_id=ofproto_v1_3.OFP_NO_BUFFER, total_len=len(data), reason=0, table_id=0, cookie=0, match=parser.OFPMatch(in_port=record['in_port']), data=data)
+      prepared.append((classify(data), app._packet_in_handler, Event(msg)))
+    elif record['type'] == 'port_stats':
+      body = [
+        parser.OFPPortStats(**dict(ZERO_PORT_STATS, port_no=port_no, rx_bytes=rx_bytes, tx_bytes=tx_bytes, duration_sec=sec, duration_nsec=nsec))
+        for port_no, rx_bytes, tx_bytes, sec, nsec in record['stats']
+      ]
+      msg = parser.OFPPortStatsReply(dp, body=body)
+      prepared.append(('port_stats', app._port_stats_reply_handler, Event(msg)))
+  return prepared
+
+def run(app, prepared):
+  """
+  Consegna gli eventi uno alla volta e restituisce durata totale, latenze e messaggi inviati per tipo di evento
+  """
+  latencies = defaultdict(list)
+  messages = defaultdict(Counter)
+  dps = list(app.datapaths.values())
+
+  start = time.perf_counter()
+  for kind, handler, ev in prepared:
+    before = [Counter(dp.sent) for dp in dps] if kind != 'lldp' else None
+    t = time.perf_counter()
+    handler(ev)
+    latencies[kind].append(time.perf_counter() - t)
+    # I PacketOut rilasciati dalle risposte alle barrier contano per l'evento che le ha causate
+    deliver_barriers(app)
+    if before is not None:
+      for dp, sent in zip(dps, before):
+        messages[kind].update(dp.sent - sent)
+  elapsed = time.perf_counter() - start
+
+  return {'elapsed': elapsed, 'events': len(prepared), 'latencies': dict(latencies), 'messages': dict(messages)}
+
+def percentile(values, p):
+  values = sorted(values)
+  return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+def print_report(report):
+  packet_ins = sum(len(values) for kind, values in report['latencies'].items() if kind != 'port_stats')
+  # La misura per evento aggiunge overhead: il rate e' calcolato sulla somma delle latenze dei packet-in
+  handler_time = sum(sum(values) for kind, values in report['latencies'].items() if kind != 'port_stats')
+  print(f"Eventi: {report['events']} in {report['elapsed']:.2f} s | packet-in: {packet_ins} ({packet_ins / handler_time:.0f} pkt-in/s)")
+  print(f"  {'evento':<11}{'n':>7}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'max us':>10}  messaggi/evento")
+  for kind, values in sorted(report['latencies'].items()):
+    counts = report['messages'].get(kind, Counter())
+    per_event = ', '.join(f'{name}: {count / len(values):.2f}' for name, count in sorted(counts.items())) or '-'
+    print(f"  {kind:<11}{len(values):>7}" + ''.join(f'{percentile(values, p) * 1e6:>10.1f}' for p in (50, 90, 99, 100)) + f'  {per_event}')
+
+if __name__ == '__main__':
+  app, hosts = build_controller(sys.argv[3] if len(sys.argv) > 3 else TOPOLOGY_PATH)
+  learn_hosts(app, hosts)
+
+  source = sys.argv[1] if len(sys.argv) > 1 else str(EVENTS)
+  records = generate(app, hosts, int(source)) if source.isdigit() else load_trace(source)
+  if len(sys.argv) > 2 and sys.argv[2] != '-':
+    save_trace(records, sys.argv[2])
+
+  print_report(run(app, prepare(app, records)))
+  print(f'Installazioni: {app.install_stats}')
+  if controller.SHADOW_FLOW_TABLE:
+    print(f'Shadow flow table: {app.flow_table.stats()}')
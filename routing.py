@@ -0,0 +1,574 @@
+from collections import OrderedDict, defaultdict
+from heapq import heappush, heappop
+import time
+
+# Costo di default di un link quando non ci sono ancora statistiche (come in controller.py)
+DEFAULT_WEIGHT = 10
+INF = float('inf')
+
+class RoutingEngine:
+  """
+  Motore di routing con heap binario su una rappresentazione compatta del grafo:
+  gli switch sono indicizzati con interi (in ordine di dpid) e adiacenze, porte e pesi
+  sono liste parallele per indice, cosi' una ricerca non ricostruisce dizionari su tutti gli switch.
+
+  L'euristica di A* usa `landmarks` switch di riferimento (ALT): per la disuguaglianza
+  triangolare |d(L, t) - d(L, v)| e' un limite inferiore del costo da v a t, valido per qualunque
+  topologia. Le coordinate, se presenti, devono essere anch'esse un limite inferiore del costo
+  e vengono combinate con i landmark prendendo il massimo.
+  """
+
+  def __init__(self, coords=None, default_weight=DEFAULT_WEIGHT, landmarks=0):
+    self.coords = coords if coords is not None else {}
+    self.default_weight = default_weight
+    self.landmark_count = landmarks
+
+    self.nodes = []       # indice -> dpid
+    self.index = {}       # dpid -> indice
+    self.neighbors = []   # indice -> [indice vicino]
+    self.ports = []       # indice -> [porta di uscita verso il vicino]
+    self.weights = []     # indice -> [peso del link verso il vicino]
+    self.slots = {}       # (dpid, porta) -> (indice, posizione nella lista dei vicini)
+    self.in_edges = []    # indice -> [(indice sorgente, posizione)] dei link entranti
+    self.xs = []
+    self.ys = []
+
+    # Incrementata a ogni rebuild (gli indici cambiano); dirty raccoglie i link
+    # (indice, posizione) il cui peso e' cambiato dall'ultima pop_dirty_links()
+    self.version = 0
+    self.dirty = set()
+    self.weight_changes = 0
+
+    # Landmark scelti al rebuild; le distanze da/verso ciascuno vengono ricalcolate da
+    # refresh_landmarks() (timbro (version, weight_changes) dell'ultimo calcolo)
+    self.landmarks = []       # indici degli switch landmark
+    self.landmark_dist = []   # per landmark: (distanze da L, distanze verso L)
+    self._landmark_stamp = None
+
+    # Nodi estratti dall'heap dall'ultima ricerca (per i benchmark)
+    self.expanded = 0
+
+    # Array di lavoro riutilizzati tra le ricerche: un valore e' valido solo se il suo
+    # timbro coincide con la generazione corrente, quindi non serve reinizializzarli
+    self._generation = 0
+    self._dist = []
+    self._prev = []
+    self._seen = []
+    self._closed = []
+
+  def rebuild(self, switches, adjacency, link_weights):
+    self.nodes = sorted(set(switches))
+    self.index = {dpid: i for i, dpid in enumerate(self.nodes)}
+    n = len(self.nodes)
+
+    self.neighbors = [[] for _ in range(n)]
+    self.ports = [[] for _ in range(n)]
+    self.weights = [[] for _ in range(n)]
+    self.in_edges = [[] for _ in range(n)]
+    self.slots = {}
+
+    for u, peers in adjacency.items():
+      i = self.index.get(u)
+      if i is None: continue
+      for v, port_no in peers.items():
+        j = self.index.get(v)
+        if j is None or port_no is None: continue
+        self.slots[(u, port_no)] = (i, len(self.neighbors[i]))
+        self.in_edges[j].append((i, len(self.neighbors[i])))
+        self.neighbors[i].append(j)
+        self.ports[i].append(port_no)
+        self.weights[i].append(link_weights.get((u, port_no), self.default_weight))
+
+    self.xs = [None] * n
+    self.ys = [None] * n
+    for i, dpid in enumerate(self.nodes):
+      if dpid in self.coords:
+        self.xs[i], self.ys[i] = self.coords[dpid]
+
+    self._generation = 0
+    self._dist = [0] * n
+    self._prev = [-1] * n
+    self._seen = [0] * n
+    self._closed = [0] * n
+
+    self.version += 1
+    self.dirty.clear()
+    self.landmarks = []
+    self.landmark_dist = []
+    self._landmark_stamp = None
+
+  def set_weight(self, dpid, port_no, weight):
+    slot = self.slots.get((dpid, port_no))
+    if slot is None: return False
+    i, pos = slot
+    if self.weights[i][pos] != weight:
+      self.weights[i][pos] = weight
+      self.dirty.add(slot)
+      self.weight_changes += 1
+    return True
+
+  def snapshot(self):
+    """
+    Copia su cui cercare da un altro thread: la struttura del grafo e' condivisa (rebuild la
+    sostituisce senza modificarla), pesi e landmark sono copiati (A* sulla copia puo' sceglierli
+    e ricalcolarli) e gli array di lavoro sono propri
+    """
+    copy = RoutingEngine.__new__(RoutingEngine)
+    copy.__dict__.update(self.__dict__)
+    copy.weights = [list(weights) for weights in self.weights]
+    copy.landmarks = list(self.landmarks)
+    copy.landmark_dist = list(self.landmark_dist)
+    copy.dirty = set()
+
+    n = len(self.nodes)
+    copy._generation = 0
+    copy._dist = [0] * n
+    copy._prev = [-1] * n
+    copy._seen = [0] * n
+    copy._closed = [0] * n
+    return copy
+
+  def pop_dirty_links(self):
+    dirty = self.dirty
+    self.dirty = set()
+    return dirty
+
+  def _next_generation(self):
+    self._generation += 1
+    return self._generation
+
+  def _build_path(self, s, t):
+    path = []
+    prev = self._prev
+    curr = t
+    while curr != -1:
+      path.append(self.nodes[curr])
+      if curr == s: break
+      curr = prev[curr]
+    path.reverse()
+    return path if path[0] == self.nodes[s] else None
+
+  def dijkstra(self, src, dst):
+    if src == dst:
+      return [src]
+
+    s = self.index.get(src)
+    t = self.index.get(dst)
+    if s is None or t is None:
+      return None
+
+    gen = self._next_generation()
+    dist, prev, seen, closed = self._dist, self._prev, self._seen, self._closed
+    neighbors, weights = self.neighbors, self.weights
+
+    dist[s] = 0
+    prev[s] = -1
+    seen[s] = gen
+    heap = [(0, s)]
+
+    # A parita' di distanza viene estratto l'indice piu' basso, cioe' il dpid piu' basso:
+    # e' lo stesso ordine con cui la vecchia versione sceglieva il minimo
+    expanded = 0
+    while heap:
+      d, u = heappop(heap)
+      if closed[u] == gen: continue
+      closed[u] = gen
+      expanded += 1
+      if u == t: break
+
+      for v, w in zip(neighbors[u], weights[u]):
+        if closed[v] == gen: continue
+        alt = d + w
+        if seen[v] != gen or alt < dist[v]:
+          seen[v] = gen
+          dist[v] = alt
+          prev[v] = u
+          heappush(heap, (alt, v))
+
+    self.expanded = expanded
+    if seen[t] != gen:
+      return None
+    return self._build_path(s, t)
+
+  def astar(self, src, dst):
+    if src == dst:
+      return [src]
+
+    s = self.index.get(src)
+    t = self.index.get(dst)
+    if s is None or t is None:
+      return None
+
+    h = self.heuristic(t)
+    gen = self._next_generation()
+    g, prev, seen, closed = self._dist, self._prev, self._seen, self._closed
+    neighbors, weights = self.neighbors, self.weights
+
+    g[s] = 0
+    prev[s] = -1
+    seen[s] = gen
+    heap = [(h(s), s)]
+
+    expanded = 0
+    while heap:
+      f, u = heappop(heap)
+      if closed[u] == gen: continue
+      expanded += 1
+      if u == t: break
+      closed[u] = gen
+
+      gu = g[u]
+      for v, w in zip(neighbors[u], weights[u]):
+        tentative_g_score = gu + w
+        if seen[v] != gen or tentative_g_score < g[v]:
+          seen[v] = gen
+          g[v] = tentative_g_score
+          prev[v] = u
+          # Come nella vecchia versione un nodo gia' espanso puo' essere riaperto
+          closed[v] = 0
+          heappush(heap, (tentative_g_score + h(v), v))
+
+    self.expanded = expanded
+    if seen[t] != gen:
+      return None
+    return self._build_path(s, t)
+
+  def heuristic(self, t):
+    """
+    Limite inferiore del costo da ogni switch a t: massimo tra la distanza di Manhattan
+    (se ci sono le coordinate) e i limiti dei landmark. Vale 0 se non c'e' nessuno dei due
+    """
+    self.ensure_landmarks()
+
+    xs, ys = self.xs, self.ys
+    xt, yt = xs[t], ys[t]
+
+    # Solo i limiti definiti per t: un landmark che non raggiunge t (o non e' raggiungibile
+    # da t) non da' informazioni; se invece e' v a non raggiungere L, v non raggiunge nemmeno t
+    forward = [(d_from, d_from[t]) for d_from, _ in self.landmark_dist if d_from[t] != INF]
+    backward = [(d_to, d_to[t]) for _, d_to in self.landmark_dist if d_to[t] != INF]
+
+    if not forward and not backward:
+      if xt is None:
+        return lambda v: 0
+      return lambda v: abs(xs[v] - xt) + abs(ys[v] - yt) if xs[v] is not None else 0
+
+    def h(v):
+      best = abs(xs[v] - xt) + abs(ys[v] - yt) if xt is not None and xs[v] is not None else 0
+      for d_from, d_from_t in forward:
+        bound = d_from_t - d_from[v]
+        if bound > best: best = bound
+      for d_to, d_to_t in backward:
+        bound = d_to[v] - d_to_t
+        if bound > best: best = bound
+      return best
+    return h
+
+  def refresh_landmarks(self):
+    """
+    Ricalcola le tabelle dei landmark se pesi o topologia sono cambiati dall'ultimo calcolo:
+    da chiamare una volta dopo ogni giro di statistiche e dopo ogni rebuild. True se ricalcolate
+    """
+    if not self.landmark_count or self._landmark_stamp == (self.version, self.weight_changes):
+      return False
+    self.update_landmarks()
+    return True
+
+  def ensure_landmarks(self):
+    """
+    Fallback per le ricerche: calcola le tabelle solo se mancano per la topologia corrente.
+    Tra due refresh_landmarks() i limiti usano i pesi del calcolo precedente, quindi dopo un
+    cambio di pesi A* puo' restituire un percorso non ottimo fino al refresh successivo
+    """
+    if self.landmark_count and (self._landmark_stamp is None or self._landmark_stamp[0] != self.version):
+      self.update_landmarks()
+
+  def update_landmarks(self):
+    """
+    Ricalcola le distanze da e verso i landmark con i pesi correnti. Dopo un rebuild sceglie
+    prima i landmark, in modo greedy: ogni nuovo landmark e' lo switch piu' lontano da quelli
+    gia' scelti (il primo il piu' lontano dallo switch 0), cosi' stanno ai bordi della rete
+    """
+    n = len(self.nodes)
+    if not self.landmarks and n:
+      closest = self.distances(0)
+      while len(self.landmarks) < min(self.landmark_count, n):
+        candidates = [v for v in range(n) if closest[v] != INF and v not in self.landmarks]
+        if not candidates: break
+        landmark = max(candidates, key=closest.__getitem__)
+        d_from = self.distances(landmark)
+        closest = d_from if not self.landmarks else [min(a, b) for a, b in zip(closest, d_from)]
+        self.landmarks.append(landmark)
+
+    self.landmark_dist = [(self.distances(l), self.distances(l, reverse=True)) for l in self.landmarks]
+    self._landmark_stamp = (self.version, self.weight_changes)
+
+  def distances(self, s, reverse=False):
+    """
+    Distanze minime da s a tutti gli switch (verso s con reverse=True), INF se irraggiungibili
+    """
+    n = len(self.nodes)
+    dist = [INF] * n
+    done = [False] * n
+    neighbors, weights, in_edges = self.neighbors, self.weights, self.in_edges
+
+    dist[s] = 0
+    heap = [(0, s)]
+    while heap:
+      d, u = heappop(heap)
+      if done[u]: continue
+      done[u] = True
+
+      if reverse:
+        edges = ((v, weights[v][pos]) for v, pos in in_edges[u])
+      else:
+        edges = zip(neighbors[u], weights[u])
+      for v, w in edges:
+        alt = d + w
+        if alt < dist[v]:
+          dist[v] = alt
+          heappush(heap, (alt, v))
+    return dist
+
+  def multipath(self, dst, slack=0.0, max_next_hops=None):
+    """
+    Per ogni switch i prossimi hop verso dst con costo (link + distanza del vicino) entro
+    (1 + slack) volte il minimo. Sono ammessi solo vicini strettamente piu' vicini a dst, quindi
+    i percorsi non hanno cicli. Restituisce {dpid: [(dpid vicino, porta, costo)]} ordinati per costo
+    """
+    t = self.index.get(dst)
+    if t is None: return {}
+
+    dist = self.distances(t, reverse=True)
+    nodes, neighbors, ports, weights = self.nodes, self.neighbors, self.ports, self.weights
+    result = {}
+    for u, d in enumerate(dist):
+      if u == t or d == INF: continue
+      limit = (1 + slack) * d
+      hops = sorted(
+        (w + dist[v], nodes[v], port_no)
+        for v, port_no, w in zip(neighbors[u], ports[u], weights[u])
+        if dist[v] < d and w + dist[v] <= limit
+      )
+      result[nodes[u]] = [(peer, port_no, cost) for cost, peer, port_no in hops[:max_next_hops]]
+    return result
+
+  def sink_tree(self, t):
+    """
+    Dijkstra all'indietro dalla destinazione t sui link entranti: restituisce per ogni
+    switch il prossimo hop verso t (-1 se irraggiungibile) e la distanza da t
+    """
+    n = len(self.nodes)
+    inf = float('inf')
+    dist = [inf] * n
+    next_hop = [-1] * n
+    done = [False] * n
+    in_edges, weights = self.in_edges, self.weights
+
+    dist[t] = 0
+    heap = [(0, t)]
+    while heap:
+      d, v = heappop(heap)
+      if done[v]: continue
+      done[v] = True
+
+      for u, pos in in_edges[v]:
+        if done[u]: continue
+        alt = d + weights[u][pos]
+        if alt < dist[u]:
+          dist[u] = alt
+          next_hop[u] = v
+          heappush(heap, (alt, u))
+
+    return next_hop, dist
+
+class RoutingTable:
+  """
+  Tabella dei prossimi hop per ogni coppia (switch, switch destinazione), costruita
+  con un albero dei cammini minimi per destinazione. refresh() ricalcola solo gli alberi
+  su cui un link cambiato puo' incidere: link dell'albero, oppure link che ora accorcia
+  la distanza del suo nodo sorgente verso la destinazione.
+  """
+
+  def __init__(self, engine):
+    self.engine = engine
+    self.trees = []     # indice destinazione -> (next_hop, dist)
+    self.version = None
+    self.last_refresh = None
+
+  def refresh(self):
+    start = time.perf_counter()
+    engine = self.engine
+    # Letta all'inizio: se il refresh gira su un altro thread e nel frattempo il grafo
+    # viene ricostruito, la tabella resta marcata come non aggiornata
+    version = engine.version
+    dirty = engine.pop_dirty_links()
+    n = len(engine.nodes)
+
+    if self.version != version:
+      self.trees = [engine.sink_tree(t) for t in range(n)]
+      self.version = version
+      recomputed = n
+    else:
+      recomputed = 0
+      neighbors, weights = engine.neighbors, engine.weights
+      for t in range(n):
+        next_hop, dist = self.trees[t]
+        for i, pos in dirty:
+          v = neighbors[i][pos]
+          if next_hop[i] == v or dist[v] + weights[i][pos] < dist[i]:
+            self.trees[t] = engine.sink_tree(t)
+            recomputed += 1
+            break
+
+    self.last_refresh = {
+      'duration_ms': (time.perf_counter() - start) * 1e3,
+      'changed_links': len(dirty),
+      'trees_recomputed': recomputed,
+      'trees': n
+    }
+    return self.last_refresh
+
+  def is_current(self):
+    return self.version == self.engine.version
+
+  def next_hop(self, src, dst):
+    s = self.engine.index.get(src)
+    t = self.engine.index.get(dst)
+    if s is None or t is None or not self.is_current(): return None
+    hop = self.trees[t][0][s]
+    return self.engine.nodes[hop] if hop != -1 else None
+
+  def path(self, src, dst):
+    if src == dst:
+      return [src]
+
+    s = self.engine.index.get(src)
+    t = self.engine.index.get(dst)
+    if s is None or t is None: return None
+
+    next_hop = self.trees[t][0]
+    nodes = self.engine.nodes
+    path = [src]
+    curr = s
+    while curr != t:
+      curr = next_hop[curr]
+      if curr == -1: return None
+      path.append(nodes[curr])
+    return path
+
+  def as_dict(self):
+    """
+    Vista per il debug: {dpid destinazione: {dpid switch: dpid prossimo hop}}
+    """
+    nodes = self.engine.nodes
+    return {
+      nodes[t]: {nodes[s]: nodes[hop] for s, hop in enumerate(next_hop) if hop != -1}
+      for t, (next_hop, _) in enumerate(self.trees)
+    }
+
+class RouteCache:
+  """
+  Cache LRU (src, dst) -> path. Ogni entry ricorda i link che attraversa con il peso che
+  avevano al momento del calcolo, cosi' puo' essere invalidata singolarmente quando uno di quei
+  link sparisce o il suo peso si sposta oltre la tolleranza relativa.
+  """
+
+  def __init__(self, max_size=1024, tolerance=0.1):
+    self.max_size = max_size
+    self.tolerance = tolerance
+
+    self.entries = OrderedDict()     # (src, dst) -> (path, {(dpid, porta): peso})
+    self.link_index = defaultdict(set) # (dpid, porta) -> {(src, dst)}
+
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.invalidations = 0
+
+  def __len__(self):
+    return len(self.entries)
+
+  def __contains__(self, key):
+    # Non conta come hit/miss e non aggiorna l'ordine LRU
+    return key in self.entries
+
+  def get(self, src, dst):
+    entry = self.entries.get((src, dst))
+    if entry is None:
+      self.misses += 1
+      return None
+    self.entries.move_to_end((src, dst))
+    self.hits += 1
+    return entry[0]
+
+  def put(self, src, dst, path, links):
+    key = (src, dst)
+    if key in self.entries:
+      self._remove(key)
+
+    self.entries[key] = (path, links)
+    for link in links:
+      self.link_index[link].add(key)
+
+    while len(self.entries) > self.max_size:
+      self._remove(next(iter(self.entries)))
+      self.evictions += 1
+
+  def _remove(self, key):
+    _, links = self.entries.pop(key)
+    for link in links:
+      keys = self.link_index.get(link)
+      if keys is None: continue
+      keys.discard(key)
+      if not keys:
+        del self.link_index[link]
+
+  def invalidate_link(self, dpid, port_no):
+    keys = self.link_index.get((dpid, port_no))
+    if not keys: return 0
+    stale = list(keys)
+    for key in stale:
+      self._remove(key)
+    self.invalidations += len(stale)
+    return len(stale)
+
+  def update_weight(self, dpid, port_no, weight):
+    keys = self.link_index.get((dpid, port_no))
+    if not keys: return 0
+
+    stale = []
+    for key in keys:
+      cached_weight = self.entries[key][1][(dpid, port_no)]
+      if abs(weight - cached_weight) > self.tolerance * cached_weight:
+        stale.append(key)
+
+    for key in stale:
+      self._remove(key)
+    self.invalidations += len(stale)
+    return len(stale)
+
+  def links_changed(self, added_links, removed_links):
+    # Link come (dpid, porta, dpid vicino). Un link nuovo puo' accorciare qualunque percorso:
+    # in quel caso si svuota tutto, per i link rimossi basta invalidare le entry che li attraversano
+    if added_links:
+      self.invalidations += len(self.entries)
+      self.clear()
+      return
+
+    for dpid, port_no, _ in removed_links:
+      self.invalidate_link(dpid, port_no)
+
+  def clear(self):
+    self.entries.clear()
+    self.link_index.clear()
+
+  def stats(self):
+    return {
+      'size': len(self.entries),
+      'max_size': self.max_size,
+      'hits': self.hits,
+      'misses': self.misses,
+      'evictions': self.evictions,
+      'invalidations': self.invalidations
+    }
@@ -0,0 +1,231 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+# Pool di sessioni SSH persistenti per flask_server.py: per ogni host una connessione master di
+# OpenSSH (ControlMaster) su cui i comandi viaggiano come sessioni multiplexate, senza rifare
+# handshake TCP e scambio delle chiavi a ogni richiesta.
+
+SSH_OPTIONS = [
+  '-o', 'StrictHostKeyChecking=no',
+  '-o', 'UserKnownHostsFile=/dev/null',
+  '-o', 'LogLevel=ERROR',
+  '-o', 'BatchMode=yes',
+  '-o', 'ConnectTimeout=5',
+  '-o', 'ServerAliveInterval=5',
+  '-o', 'ServerAliveCountMax=2'
+]
+
+# ssh esce con 255 per gli errori suoi (connessione, autenticazione), altrimenti con il codice del comando
+# (che puo' essere anch'esso 255: per distinguerli si controlla il master)
+SSH_ERROR = 255
+
+class SSHTransport:
+  """
+  Connessioni master di OpenSSH, una socket di controllo per host in control_dir
+  """
+
+  def __init__(self, user='root', options=SSH_OPTIONS, control_dir=None):
+    self.user = user
+    self.options = list(options)
+    self.control_dir = control_dir or tempfile.mkdtemp(prefix='ssh_pool_')
+
+  def control_path(self, host):
+    return os.path.join(self.control_dir, f'{host}.sock')
+
+  def base_args(self, host):
+    return ['ssh', *self.options, '-S', self.control_path(host)]
+
+  def target(self, host):
+    return f'{self.user}@{host}'
+
+  def connect(self, host, timeout):
+    # Socket di un master morto: ssh -M non la sostituirebbe e partirebbe senza multiplexing
+    if os.path.exists(self.control_path(host)):
+      os.unlink(self.control_path(host))
+    # -f: il master va in background dopo l'autenticazione, -N: nessun comando
+    args = self.base_args(host) + ['-M', '-N', '-f', '-o', 'ControlPersist=yes', self.target(host)]
+    result = subprocess.run(args, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=timeout)
+    return result.returncode == 0, result.stderr.strip()
+
+  def check(self, host, timeout):
+    args = self.base_args(host) + ['-O', 'check', self.target(host)]
+    return subprocess.run(args, stdin=subprocess.DEVNULL, capture_output=True, timeout=timeout).returncode == 0
+
+  def run(self, host, command, timeout):
+    # ControlMaster=no: se il master non c'e' piu' ssh fallisce (255) invece di aprire una connessione nuova
+    args = self.base_args(host) + ['-o', 'ControlMaster=no', self.target(host), command]
+    return subprocess.run(args, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=timeout)
+
+  def stream(self, host, command):
+    args = self.base_args(host) + ['-o', 'ControlMaster=no', self.target(host), command]
+    return subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+
+  def disconnect(self, host, timeout):
+    args = self.base_args(host) + ['-O', 'exit', self.target(host)]
+    subprocess.run(args, stdin=subprocess.DEVNULL, capture_output=True, timeout=timeout)
+
+class LocalTransport:
+  """
+  Al posto di ssh esegue i comandi sulla macchina locale con sh: per provare il server senza sshd
+  """
+
+  def connect(self, host, timeout):
+    return True, ''
+
+  def check(self, host, timeout):
+    return True
+
+  def run(self, host, command, timeout):
+    return subprocess.run(['sh', '-c', command], stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=timeout)
+
+  def stream(self, host, command):
+    return subprocess.Popen(['sh', '-c', command], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+
+  def disconnect(self, host, timeout):
+    pass
+
+class SSHPool:
+  """
+  Una sessione per host, aperta alla prima richiesta e riusata dalle successive.
+  Prima dell'uso, se non e' stata verificata da health_interval secondi, la sessione viene
+  controllata (ssh -O check) e riaperta se e' caduta; un comando fallito con un errore di ssh
+  viene ripetuto una volta su una sessione nuova. Le sessioni inutilizzate da idle_timeout
+  secondi vengono chiuse da un thread in background, mai finche' hanno comandi avviati con stream()
+  ancora in esecuzione (chiudere il master li interromperebbe)
+  """
+
+  def __init__(self, transport=None, idle_timeout=60, health_interval=10, connect_timeout=10):
+    self.transport = transport if transport is not None else SSHTransport()
+    self.idle_timeout = idle_timeout
+    self.health_interval = health_interval
+    self.connect_timeout = connect_timeout
+
+    self.lock = threading.Lock()
+    self.sessions = {}  # host -> {'lock', 'connected', 'closed', 'last_used', 'last_check', 'streams'}
+    self.evictor = None
+
+    self.counters = {'connects': 0, 'connect_errors': 0, 'reused': 0, 'health_checks': 0, 'reconnects': 0, 'evicted': 0, 'commands': 0}
+
+  def session(self, host):
+    with self.lock:
+      if self.evictor is None:
+        self.evictor = threading.Thread(target=self.evict_idle, daemon=True)
+        self.evictor.start()
+      session = self.sessions.get(host)
+      if session is None:
+        session = self.sessions[host] = {'lock': threading.Lock(), 'connected': False, 'closed': False, 'last_used': 0, 'last_check': 0, 'streams': 0}
+      return session
+
+  def acquire(self, host):
+    """
+    Sessione verso host pronta all'uso; solleva ConnectionError se non si riesce ad aprirla
+    """
+    session = self.session(host)
+    # Il lock della sessione evita che due richieste contemporanee aprano due master verso lo stesso host
+    with session['lock']:
+      if session['closed']:
+        # Chiusa per inattivita' mentre si aspettava il lock
+        return self.acquire(host)
+      now = time.monotonic()
+      if session['connected'] and now - session['last_check'] > self.health_interval:
+        self.counters['health_checks'] += 1
+        if not self.transport.check(host, self.connect_timeout):
+          session['connected'] = False
+          self.counters['reconnects'] += 1
+        session['last_check'] = now
+
+      if session['connected']:
+        self.counters['reused'] += 1
+      else:
+        ok, error = self.transport.connect(host, self.connect_timeout)
+        if not ok:
+          self.counters['connect_errors'] += 1
+          raise ConnectionError(f'SSH verso {host} non disponibile: {error}')
+        self.counters['connects'] += 1
+        session['connected'] = True
+        session['last_check'] = now
+      session['last_used'] = now
+    return session
+
+  def run(self, host, command, timeout=5):
+    """
+    Esegue command su host e restituisce il CompletedProcess (returncode, stdout, stderr).
+    Solleva ConnectionError o subprocess.TimeoutExpired
+    """
+    self.counters['commands'] += 1
+    session = self.acquire(host)
+    result = self.transport.run(host, command, timeout)
+    if result.returncode == SSH_ERROR and not self.transport.check(host, self.connect_timeout):
+      # Il master e' caduto tra il controllo e il comando: si riapre e si riprova una volta.
+      # Con il master ancora attivo 255 e' il codice di uscita del comando e non va ripetuto
+      session['connected'] = False
+      self.counters['reconnects'] += 1
+      self.acquire(host)
+      result = self.transport.run(host, command, timeout)
+    return result
+
+  def stream(self, host, command):
+    """
+    Avvia command su host e restituisce il Popen con stdout (e stderr) da leggere riga per riga.
+    Solleva ConnectionError se la sessione non si apre
+    """
+    self.counters['commands'] += 1
+    session = self.acquire(host)
+    with self.lock:
+      session['streams'] += 1
+    try:
+      process = self.transport.stream(host, command)
+    except Exception:
+      self.stream_closed(session)
+      raise
+    threading.Thread(target=self.track_stream, args=(session, process), daemon=True).start()
+    return process
+
+  def track_stream(self, session, process):
+    process.wait()
+    self.stream_closed(session)
+
+  def stream_closed(self, session):
+    # L'inattivita' della sessione si conta dalla fine dell'ultimo comando
+    with self.lock:
+      session['streams'] -= 1
+      session['last_used'] = time.monotonic()
+
+  def evict_idle(self):
+    while True:
+      time.sleep(max(1, self.idle_timeout / 4))
+      now = time.monotonic()
+      with self.lock:
+        idle = [host for host, session in self.sessions.items() if not session['streams'] and now - session['last_used'] > self.idle_timeout]
+      for host in idle:
+        self.close(host, evicted=True)
+
+  def close(self, host, evicted=False):
+    with self.lock:
+      session = self.sessions.get(host)
+    if session is None: return
+    with session['lock']:
+      # Potrebbe essere stata usata mentre si aspettava il lock
+      if evicted and (session['streams'] or time.monotonic() - session['last_used'] <= self.idle_timeout): return
+      if session['connected']:
+        self.transport.disconnect(host, self.connect_timeout)
+      session['closed'] = True
+      with self.lock:
+        del self.sessions[host]
+      if evicted:
+        self.counters['evicted'] += 1
+
+  def close_all(self):
+    with self.lock:
+      hosts = list(self.sessions)
+    for host in hosts:
+      self.close(host)
+
+  def stats(self):
+    with self.lock:
+      open_sessions = sum(1 for session in self.sessions.values() if session['connected'])
+      streams = sum(session['streams'] for session in self.sessions.values())
+    return dict(self.counters, sessions=open_sessions, streams=streams)
@@ -0,0 +1,133 @@
+from collections import defaultdict
+
+# Sfasamento degli switch: multipli della sezione aurea modulo 1 sono distribuiti uniformemente in [0, 1)
+GOLDEN_RATIO = 0.6180339887
+
+class StatsPoller:
+  """
+  Decide quando chiedere le OFPPortStats di ogni porta invece di interrogare tutti gli switch
+  nello stesso istante. Ogni switch ha una fase diversa dentro l'intervallo, cosi' le risposte
+  non arrivano tutte insieme; ogni porta ha il suo intervallo, che si dimezza quando il peso
+  cambia di oltre change_threshold (relativo) e cresce piano quando resta stabile, fino a
+  max_interval per le porte scariche e busy_max_interval per quelle con traffico (peso oltre busy_weight).
+  Conta anche richieste, risposte e eta' dell'ultimo campione di ogni porta (freschezza dei pesi)
+  """
+
+  def __init__(self, base_interval=3, min_interval=0.5, max_interval=10, busy_max_interval=3,
+               busy_weight=15, change_threshold=0.1, growth=1.25, batch_ratio=0.5):
+    self.base_interval = base_interval
+    self.min_interval = min_interval
+    self.max_interval = max_interval
+    self.busy_max_interval = busy_max_interval
+    self.busy_weight = busy_weight
+    self.change_threshold = change_threshold
+    self.growth = growth
+    # Se almeno questa frazione delle porte di uno switch e' da interrogare basta una richiesta OFPP_ANY
+    self.batch_ratio = batch_ratio
+
+    self.next_due = {}     # (dpid, porta) -> istante della prossima richiesta
+    self.intervals = {}    # (dpid, porta) -> intervallo di polling corrente
+    self.weights = {}      # (dpid, porta) -> ultimo peso pubblicato dallo stimatore
+    self.last_sample = {}  # (dpid, porta) -> istante dell'ultimo campione ricevuto
+
+    self.start = {}                  # dpid -> istante della prima richiesta
+    self.requests = defaultdict(int) # dpid -> richieste inviate
+    self.replies = defaultdict(int)  # dpid -> risposte ricevute
+    self.entries = defaultdict(int)  # dpid -> statistiche di porta ricevute (dimensione delle risposte)
+
+  def phase(self, dpid):
+    return (dpid * GOLDEN_RATIO) % 1
+
+  def due(self, switch_ports, now):
+    """
+    Richieste da inviare adesso: [(dpid, porta)], porta None per tutte le porte dello switch
+    """
+    requests = []
+    for dpid, ports in switch_ports.items():
+      if not ports: continue
+      due = []
+      for port_no in ports:
+        key = (dpid, port_no)
+        if key not in self.next_due:
+          # Prima richiesta sfasata in base allo switch
+          self.intervals[key] = self.base_interval
+          self.next_due[key] = now + self.phase(dpid) * self.base_interval
+        if self.next_due[key] <= now:
+          due.append(port_no)
+      if not due: continue
+
+      for port_no in due:
+        self.next_due[(dpid, port_no)] = now + self.intervals[(dpid, port_no)]
+      if len(due) >= self.batch_ratio * len(ports):
+        requests.append((dpid, None))
+      else:
+        requests.extend((dpid, port_no) for port_no in due)
+    return requests
+
+  def sent(self, dpid, now):
+    self.start.setdefault(dpid, now)
+    self.requests[dpid] += 1
+
+  def replied(self, dpid, entries):
+    self.replies[dpid] += 1
+    self.entries[dpid] += entries
+
+  def observe(self, dpid, port_no, weight, now):
+    """
+    Campione ricevuto per la porta; weight e' il peso pubblicato dallo stimatore o None se non e' cambiato
+    """
+    key = (dpid, port_no)
+    self.last_sample[key] = now
+    prev = self.weights.get(key)
+    if weight is not None:
+      self.weights[key] = weight
+    current = self.weights.get(key)
+
+    change = abs(weight - prev) / prev if weight is not None and prev else 0
+    busy = current is not None and current > self.busy_weight
+    interval = self.intervals.get(key, self.base_interval)
+    if change > self.change_threshold:
+      interval = max(self.min_interval, interval / 2)
+    else:
+      interval = min(self.busy_max_interval if busy else self.max_interval, interval * self.growth)
+    self.intervals[key] = interval
+
+  def forget(self, switch_ports):
+    # Stato delle porte e degli switch non piu' presenti
+    for state in (self.next_due, self.intervals, self.weights, self.last_sample):
+      for key in [key for key in state if key[1] not in switch_ports.get(key[0], ())]:
+        del state[key]
+    for state in (self.start, self.requests, self.replies, self.entries):
+      for dpid in [dpid for dpid in state if dpid not in switch_ports]:
+        del state[dpid]
+
+  def report(self, switch_ports, now):
+    """
+    Per switch: richieste al secondo, statistiche di porta ricevute, intervallo medio e
+    eta' (media e massima) dell'ultimo campione delle porte
+    """
+    self.forget(switch_ports)
+    report = {}
+    for dpid, ports in switch_ports.items():
+      ages = [now - self.last_sample[(dpid, port_no)] for port_no in ports if (dpid, port_no) in self.last_sample]
+      intervals = [self.intervals[(dpid, port_no)] for port_no in ports if (dpid, port_no) in self.intervals]
+      elapsed = now - self.start.get(dpid, now)
+      report[dpid] = {
+        'requests': self.requests[dpid],
+        'replies': self.replies[dpid],
+        'port_entries': self.entries[dpid],
+        'requests_per_second': self.requests[dpid] / elapsed if elapsed > 0 else 0,
+        'mean_interval': sum(intervals) / len(intervals) if intervals else None,
+        'mean_age': sum(ages) / len(ages) if ages else None,
+        'max_age': max(ages) if ages else None,
+        'unsampled_ports': len(ports) - len(ages)
+      }
+    return report
+
+  def stats(self):
+    return {
+      'requests': sum(self.requests.values()),
+      'replies': sum(self.replies.values()),
+      'port_entries': sum(self.entries.values()),
+      'ports': len(self.next_due)
+    }
@@ -0,0 +1,65 @@
+from collections import deque
+from logging.handlers import QueueListener, RotatingFileHandler
+import json
+import logging
+import os
+import queue
+
+class TelemetryWriter:
+  """
+  Scrive ogni snapshot come un record JSON Lines su un file a rotazione, da un thread
+  in background (QueueListener), e tiene in memoria solo gli ultimi ring_size snapshot
+  """
+
+  def __init__(self, path, max_bytes=10*1024*1024, backup_count=5, ring_size=100):
+    self.path = path
+    self.recent = deque(maxlen=ring_size)
+
+    # Come il vecchio save(): ogni esecuzione sostituisce l'output della precedente
+    for file_path in rotated_files(path, backup_count):
+      os.remove(file_path)
+
+    self.handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+    self.handler.setFormatter(logging.Formatter('%(message)s'))
+    self.queue = queue.SimpleQueue()
+    self.listener = QueueListener(self.queue, self.handler)
+    self.listener.start()
+
+  def write(self, record):
+    self.recent.append(record)
+    self.queue.put_nowait(logging.makeLogRecord({'msg': json.dumps(record)}))
+
+  def close(self):
+    # stop() attende che la coda sia stata scritta tutta
+    self.listener.stop()
+    self.handler.close()
+
+def rotated_files(path, backup_count=None):
+  """
+  File esistenti di una serie a rotazione, dal piu' vecchio (path.N) al piu' recente (path)
+  """
+  files = []
+  i = 1
+  while (backup_count is None or i <= backup_count) and os.path.exists(f'{path}.{i}'):
+    files.append(f'{path}.{i}')
+    i += 1
+  files.reverse()
+  if os.path.exists(path):
+    files.append(path)
+  return files
+
+def load_frames(algorithm):
+  """
+  Snapshot salvati dal controller per l'algoritmo dato: JSON Lines (con i file ruotati)
+  oppure il vecchio formato, un'unica lista JSON in {algorithm}_weighted_paths.json
+  """
+  files = rotated_files(f'{algorithm}_weighted_paths.jsonl')
+  if not files:
+    with open(f'{algorithm}_weighted_paths.json') as file:
+      return json.load(file)
+
+  frames = []
+  for file_path in files:
+    with open(file_path) as file:
+      frames.extend(json.loads(line) for line in file if line.strip())
+  return frames
@@ -6,65 +6,64 @@ from mininet.node import RemoteController as ControllerType, OVSSwitch as Switch
 from mininet.cli import CLI
 from mininet.link import TCLink
 from mininet.log import setLogLevel
+import argparse
 import time
 import json
 import os
+from topology_spec import load_topology
+from experiment_spec import EXPERIMENTS_PATH, load_experiments, expand, run_hosts, ready
 
 # ------------------------
 
 ALGORITHM = 'astar'
 
-def build_network() -> Mininet:
+# Gli esperimenti partono start_delay secondi dopo la richiesta al server; oltre start_delay + durata
+# + margine un esperimento si considera bloccato e i suoi client vengono fermati. Intervallo di
+# polling dei job e tempo massimo di attesa dei servizi (sshd, API Flask, server iperf)
+EXPERIMENT_START_DELAY = 1
+EXPERIMENT_TIMEOUT_MARGIN = 5
+JOB_POLL_INTERVAL = 0.2
+SERVICE_TIMEOUT = 10
+
+def build_network(spec = None) -> Mininet:
+  # Topologia descritta in topology.json (vedi topology_spec.py), di default la griglia 3x3
+  spec = spec if spec is not None else load_topology()
   net = Mininet(link = TCLink, autoSetMacs = True)
 
-  addresses = [
-    '10.0.0.1/24',
-    '10.0.0.2/24',
-    '11.0.0.1/24',
-    '192.168.1.1/24',
-    '10.8.1.1/24'
-  ]
-
   controller = ControllerType('c0', ip='127.0.0.1', port=6653)
 
   net.addController(controller)
 
-  hosts = []
-  for i in range(5):
-    gateway = addresses[i].split('/')[0].rsplit('.', 1)[0] + '.254'
-    host = net.addHost(f'h{i+1}', mac = f'00:00:00:00:00:0{i+1}', ip = addresses[i], defaultRoute = f'via {gateway}')
-    hosts.append(host)
-
-  switches = []
-  for i in range(1, 10):
-    switch = net.addSwitch(f's{i}', cls = SwitchType, protocols = 'OpenFlow13', failmode = 'secure')
-    switches.append(switch)
-
-  link_config = {'bw': 1000, 'delay' : '5ms'}
-
-  net.addLink(switches[0], switches[1], **link_config)
-  net.addLink(switches[1], switches[2], **link_config)
-  net.addLink(switches[3], switches[4], **link_config)
-  net.addLink(switches[4], switches[5], **link_config)
-  net.addLink(switches[6], switches[7], **link_config)
-  net.addLink(switches[7], switches[8], **link_config)
-
-  net.addLink(switches[0], switches[3], **link_config)
-  net.addLink(switches[1], switches[4], **link_config)
-  net.addLink(switches[2], switches[5], **link_config)
-  net.addLink(switches[3], switches[6], **link_config)
-  net.addLink(switches[4], switches[7], **link_config)
-  net.addLink(switches[5], switches[8], **link_config)
-
-  net.addLink(hosts[0], switches[0], bw = 100, delay = '0.05ms')
-  net.addLink(hosts[1], switches[0], bw = 100, delay = '0.05ms')
-  net.addLink(hosts[3], switches[2], bw = 100, delay = '1ms')
-  net.addLink(hosts[2], switches[6], bw = 5, delay = '0.5ms')
-  net.addLink(hosts[4], switches[8], bw = 200, delay = '1ms')
+  hosts = {}
+  for host in spec['hosts']:
+    gateway = host['ip'].split('/')[0].rsplit('.', 1)[0] + '.254'
+    hosts[host['name']] = net.addHost(host['name'], mac = host['mac'], ip = host['ip'], defaultRoute = f'via {gateway}')
+
+  # Mininet ricava il dpid dal numero nel nome dello switch
+  switches = {}
+  for switch in spec['switches']:
+    switches[switch['dpid']] = net.addSwitch(f"s{switch['dpid']}", cls = SwitchType, protocols = 'OpenFlow13', failmode = 'secure')
+
+  # Prima i link tra switch e poi gli host: e' l'ordine in cui vengono numerate le porte
+  for link in spec['links']:
+    net.addLink(switches[link['src']], switches[link['dst']], bw = link['bw'], delay = link['delay'])
+
+  for host in spec['hosts']:
+    net.addLink(hosts[host['name']], switches[host['switch']], bw = host['bw'], delay = host['delay'])
 
   return net
 
 
+def wait_until(condition, timeout = SERVICE_TIMEOUT, interval = 0.1):
+  # Al posto delle pause fisse: attende che condition() sia vera, False se scade il timeout
+  deadline = time.time() + timeout
+  while not condition():
+    if time.time() > deadline:
+      return False
+    time.sleep(interval)
+  return True
+
+
 def setup_ssh(net: Mininet):
   print("\nConfigurazione SSH")
   h1 = net.get('h1')
@@ -104,28 +103,24 @@ Subsystem sftp /usr/lib/openssh/sftp-server
     host.cmd('mkdir -p /var/run/sshd')
     host.cmd('ssh-keygen -A')
     host.cmd('/usr/sbin/sshd -f /tmp/sshd_config_mininet -D &')
-    print(f"  SSH pronto su {host.name}")
 
-  time.sleep(3)
+  for host in net.hosts:
+    listening = wait_until(lambda: ':22 ' in host.cmd('ss -ltn'))
+    print(f"  SSH {'pronto' if listening else 'NON in ascolto'} su {host.name}")
 
 
 def setup_iperf(net: Mininet):
   def start_iperf_daemon(host):
     log_path = f'data/{host.name}_server_output.csv'
     host.cmd(f'iperf -s -u -i 0.2 -y C > {log_path} &')
-    time.sleep(0.5)
 
   def assert_iperf_started(host):
+    wait_until(lambda: ':5001 ' in host.cmd('ss -lun'))
     processes = host.cmd('pgrep -a iperf')
     res = processes.strip() if processes.strip() else 'NESSUN PROCESSO!'
     print(f"{host.name}: {res}")
 
-  h1 = net.get('h1')
-  h2 = net.get('h2')
-  h3 = net.get('h3')
-  h4 = net.get('h4')
-  h5 = net.get('h5')
-  hosts = [h1, h2, h3, h4, h5]
+  hosts = net.hosts
 
   for host in hosts:
     host.cmd(f'mkdir -p data/')
@@ -138,59 +133,128 @@ def setup_iperf(net: Mininet):
     print(f'Verifica server iperf su {host.name}')
     assert_iperf_started(host)
 
-  print('\nServer iperf avviati. Attesa 3 secondi...')
-  time.sleep(3)
-
-def run_experiment(experiment, end_point_server, exp_index: int):
-  senders, receiver = experiment
-  
-  def get_start_iperf_curl(sender, rate, receiver):
-    payload = json.dumps({
-      'IP_SRC': sender.IP(),
+  print('\nServer iperf avviati')
+
+def api_request(end_point_server, method, path, payload = None):
+  # Richiesta all'API Flask con curl dall'host del server: risposta JSON, None se non valida
+  url = f'http://{end_point_server.IP()}{path}'
+  if payload is None:
+    response = end_point_server.cmd(f"curl -s -X {method} {url}")
+  else:
+    response = end_point_server.cmd(f"curl -s -X {method} -H 'Content-Type: application/json' -d '{json.dumps(payload)}' {url}")
+  try:
+    return json.loads(response)
+  except ValueError:
+    print(response)
+    return None
+
+def wait_job(end_point_server, job_id):
+  # Il server risponde subito con l'id di un job: si aspetta la fine leggendo /jobs/<id>
+  while True:
+    job = api_request(end_point_server, 'GET', f'/jobs/{job_id}')
+    if job is None or job['state'] in ('succeeded', 'failed'):
+      return job
+    time.sleep(JOB_POLL_INTERVAL)
+
+def start_run(net: Mininet, end_point_server, run):
+  """
+  Tutti i client del run in una sola richiesta: il server li lancia in parallelo e li fa partire
+  nello stesso istante. Restituisce l'id del job, None se la richiesta e' stata rifiutata
+  """
+  receiver = net.get(run['receiver'])
+  payload = {
+    'RUNTIME_OUTPUT_DIR': run['output_dir'],
+    'start_delay': EXPERIMENT_START_DELAY,
+    'senders': [{
+      'IP_SRC': net.get(sender).IP(),
       'IP_DEST': receiver.IP(),
-      'SRC_NAME': sender.name,
+      'SRC_NAME': sender,
       'DST_NAME': receiver.name,
-      'RUNTIME_OUTPUT_DIR': f'case_#{exp_index}',
-      'L4_proto': 'UDP',
-      'src_rate': rate
-    })
-
-    return (
-      f"curl -s -X POST -H 'Content-Type: application/json' "
-      f"-d '{payload}' http://{end_point_server.IP()}/start_iperf"
-    )
-
-  def get_stop_iperf_curl(sender):
-    payload = json.dumps({'IP_SRC': sender.IP()})
-    return (
-      f"curl -s -X POST -H 'Content-Type: application/json' "
-      f"-d '{payload}' http://{end_point_server.IP()}/stop_iperf"
-    )
-
-  for sender, rate in senders.items():
-    print(f"Experimenting {sender.name} -> {receiver.name} on {end_point_server.name} at rate {rate}")
-    request = get_start_iperf_curl(sender, rate, receiver)
-    sender.cmd(request)
-    time.sleep(0.5)
-
-  # Tempo per eseguire gli esperimenti (abbondante: basterebbe 10 secondi, ma non si sa mai qualche ritardo)
-  time.sleep(15)
-
-  for sender in senders.keys():
-    request = get_stop_iperf_curl(sender)
-    stop_response = sender.cmd(request)
-    print(stop_response)
-  return
+      'L4_proto': run['proto'],
+      'src_rate': rate,
+      'duration': run['duration']
+    } for sender, rate in run['senders'].items()]
+  }
+  response = api_request(end_point_server, 'POST', '/start_iperf_batch', payload)
+  return response.get('job_id') if response else None
+
+def run_finished(job):
+  # Finito quando tutti i client sono terminati (stream chiuso) o il lancio e' fallito prima di partire
+  if job is None:
+    return False
+  if 'stream' in job:
+    return job['stream']['state'] == 'finished'
+  return job['state'] == 'failed'
+
+def finish_run(net: Mininet, end_point_server, run, job_id, job):
+  if not run_finished(job):
+    print(f"{run['output_dir']}: client ancora attivi oltre la durata prevista, arresto")
+    for sender in run['senders']:
+      stop = api_request(end_point_server, 'POST', '/stop_iperf', {'IP_SRC': net.get(sender).IP()})
+      stop_job = wait_job(end_point_server, stop['job_id']) if stop is not None and 'job_id' in stop else None
+      print(stop_job['result'] if stop_job else stop)
+    # Lo stream si chiude quando il server vede terminare i client fermati
+    wait_until(lambda: run_finished(api_request(end_point_server, 'GET', f'/jobs/{job_id}')))
+    job = api_request(end_point_server, 'GET', f'/jobs/{job_id}')
+
+  # Latenze di lancio, partenze effettive e aggregati dei client, per verificare la contemporaneita' delle partenze
+  with open(f"data/{run['output_dir']}/start_batch.json", 'w') as file:
+    json.dump(job, file, indent=2)
+
+  stream = (job or {}).get('stream')
+  if stream is None:
+    print(f"{run['output_dir']}: avvio fallito")
+    return
+  skew = stream['start_skew']
+  print(f"{run['output_dir']} completato, skew di partenza: {skew * 1000:.1f} ms" if skew is not None else f"{run['output_dir']} completato")
+  for sender, totals in stream['aggregates'].items():
+    mean = totals.get('mean_bps')
+    print(f"  {sender}: {mean / 1e6 if mean is not None else 0:.2f} Mbit/s medi, uscita {totals['exit_status']}")
+
+def run_experiments(net: Mininet, end_point_server, runs):
+  """
+  Esegue i run (experiment_spec.expand) appena i loro host sono liberi: quelli con host disgiunti
+  girano in parallelo. La fine di un run e' quella dei suoi client, letta da /jobs/<id> sul server
+  """
+  pending = list(runs)
+  running = {}  # id del job -> (run, scadenza)
+  started = time.time()
+
+  while pending or running:
+    busy = set().union(*(run_hosts(run) for run, _ in running.values()))
+    for run in ready(pending, busy):
+      pending.remove(run)
+      # h1 è il server flask (api rest) con gli end points start_iperf_batch e stop_iperf:
+      # output_dir indica al server in quale cartella ridirezionare gli output del run
+      os.makedirs(f"data/{run['output_dir']}", exist_ok = True)
+      for sender, rate in run['senders'].items():
+        print(f"Experimenting {sender} -> {run['receiver']} on {end_point_server.name} at rate {rate} ({run['output_dir']})")
+      job_id = start_run(net, end_point_server, run)
+      if job_id is None:
+        print(f"{run['output_dir']}: richiesta rifiutata dal server")
+        continue
+      print(f"Report in tempo reale: curl -N http://{end_point_server.IP()}/jobs/{job_id}/stream")
+      running[job_id] = (run, time.time() + EXPERIMENT_START_DELAY + run['duration'] + EXPERIMENT_TIMEOUT_MARGIN)
+
+    time.sleep(JOB_POLL_INTERVAL)
+    for job_id, (run, deadline) in list(running.items()):
+      job = api_request(end_point_server, 'GET', f'/jobs/{job_id}')
+      if run_finished(job) or time.time() > deadline:
+        del running[job_id]
+        finish_run(net, end_point_server, run, job_id, job)
+
+  print(f"{len(runs)} esperimenti completati in {time.time() - started:.1f} secondi")
 
 setLogLevel('info')
 
-def run_topology(net: Mininet):
+def run_topology(net: Mininet, experiments_path = EXPERIMENTS_PATH, interactive = False):
+  # Esperimenti descritti in experiments.json (vedi experiment_spec.py), di default i quattro casi verso h1
+  runs = expand(load_experiments(experiments_path), [host.name for host in net.hosts])
+
   print('Start networking\n')
   net.start()
   time.sleep(5)
 
-  CLI(net)
-
   # Inizializzazione ssh
   setup_ssh(net)
 
@@ -198,46 +262,30 @@ def run_topology(net: Mininet):
   print('Avvio API Flask su h1 (IP: 10.0.0.1)')
   h1 = net.get('h1')
   h1.cmd("nohup python3 flask_server.py > log_flask.txt 2>&1 &")
-  print('API Flask avviata su h1 (IP: 10.0.0.1)')
-  time.sleep(2)
+  if wait_until(lambda: api_request(h1, 'GET', '/jobs') is not None):
+    print('API Flask avviata su h1 (IP: 10.0.0.1)')
+  else:
+    print('API Flask non raggiungibile: vedi log_flask.txt')
 
   # Avvio dei demoni iperf sugli host
   setup_iperf(net)
 
-  h1 = net.get('h1')
-  h2 = net.get('h2')
-  h3 = net.get('h3')
-  h4 = net.get('h4')
-  h5 = net.get('h5')
-
-  experiments = [
-    ({h2: '100M'}, h1),
-    ({h2: '100M', h3: '100M'}, h1),
-    ({h2: '100M', h3: '100M', h4: '5M'}, h1),
-    ({h2: '100M', h3: '100M', h4: '5M', h5: '200M'}, h1),
-  ] # in pseudo codice, ogni esperimento sarebbe "host.send_traffic_to(h1, rate) for (host, rate) in hosts.items()"
-
   # Avvio degli esperimenti
-  for i, experiment in enumerate(experiments):
-    print(f"Avvio dell'esperimento #{i+1}")
-    os.makedirs(f'data/case_#{i+1}', exist_ok = True)
-
-    # h1 è il server flask (api rest) con gli end points start_iperf e stop_iperf
-    # (l'abbiamo pensato nella maniera più generica possibile) 
-    # i+1 serve a comunicare al server flask che questo è l'esperimento #i 
-    # e quindi dovrà ridirezionare gli output nella cartella appropriata
-    run_experiment(experiment, h1, i+1)
-    
-    print(f"Esperimento #{i+1} completato")
+  run_experiments(net, h1, runs)
 
-  CLI(net)
+  if interactive:
+    CLI(net)
 
   print('Stopping network\n')
   net.stop()
 
-def run_test():
+def run_test(experiments_path = EXPERIMENTS_PATH, interactive = False):
   net = build_network()
-  run_topology(net)
+  run_topology(net, experiments_path, interactive)
 
 if __name__ == '__main__':
-  run_test()
\ No newline at end of file
+  parser = argparse.ArgumentParser(description = 'Avvia la rete ed esegue gli esperimenti')
+  parser.add_argument('experiments', nargs = '?', default = EXPERIMENTS_PATH)
+  parser.add_argument('--cli', action = 'store_true', help = 'apre la CLI di Mininet dopo gli esperimenti')
+  args = parser.parse_args()
+  run_test(args.experiments, args.cli)
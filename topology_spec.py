@@ -0,0 +1,259 @@
+import argparse
+import json
+import math
+import os
+import random
+
+# Descrizione della topologia condivisa da topology.py (Mininet), controller.py (coordinate per A*),
+# print_graphs.py e replay.py. Non dipende da Mininet. Formato (JSON):
+#   {
+#     "name": ...,
+#     "switches": [{"dpid": 1, "pos": [x, y]}, ...],
+#     "hosts": [{"name": "h1", "ip": "10.0.0.1/24", "mac": ..., "switch": dpid, "pos": [x, y], "bw": Mbit/s, "delay": "1ms"}, ...],
+#     "links": [{"src": dpid, "dst": dpid, "bw": Mbit/s, "delay": "5ms"}, ...]
+#   }
+# Le porte degli switch sono numerate nell'ordine dei link, poi degli host (come le assegna Mininet).
+#
+# Uso: python topology_spec.py grid RIGHE COLONNE | fat_tree K | random SWITCH | default  [opzioni, vedi <tipo> --help]
+
+TOPOLOGY_PATH = 'topology.json'
+
+LINK_BW = 1000
+LINK_DELAY = '5ms'
+HOST_BW = 100
+HOST_DELAY = '1ms'
+
+# Distanza tra switch vicini nelle posizioni generate
+SPACING = 2
+
+def default_topology():
+  """
+  La griglia 3x3 con 5 host usata negli esperimenti
+  """
+  positions = {1: (6, 4), 2: (8, 4), 3: (10, 4), 4: (6, 6), 5: (8, 6), 6: (10, 6), 7: (6, 8), 8: (8, 8), 9: (10, 8)}
+  hosts = [
+    # nome, ip, switch, posizione, bw, delay
+    ('h1', '10.0.0.1/24', 1, (4, 2), 100, '0.05ms'),
+    ('h2', '10.0.0.2/24', 1, (2, 2), 100, '0.05ms'),
+    ('h3', '11.0.0.1/24', 7, (2, 8), 5, '0.5ms'),
+    ('h4', '192.168.1.1/24', 3, (14, 4), 100, '1ms'),
+    ('h5', '10.8.1.1/24', 9, (14, 8), 200, '1ms')
+  ]
+  links = [(1, 2), (2, 3), (4, 5), (5, 6), (7, 8), (8, 9), (1, 4), (2, 5), (3, 6), (4, 7), (5, 8), (6, 9)]
+
+  return {
+    'name': 'default',
+    'switches': [{'dpid': dpid, 'pos': list(pos)} for dpid, pos in positions.items()],
+    'hosts': [
+      {'name': name, 'ip': ip, 'mac': host_mac(i), 'switch': switch, 'pos': list(pos), 'bw': bw, 'delay': delay}
+      for i, (name, ip, switch, pos, bw, delay) in enumerate(hosts)
+    ],
+    'links': [{'src': a, 'dst': b, 'bw': LINK_BW, 'delay': LINK_DELAY} for a, b in links]
+  }
+
+def host_mac(i):
+  # Come autoSetMacs di Mininet: hN ha MAC N
+  return ':'.join('%02x' % b for b in (i + 1).to_bytes(6, 'big'))
+
+def host_ip(i):
+  # Una /24 per host, gateway .254 (il controller risponde all'ARP per qualunque IP)
+  return f'10.{(i >> 8) & 255}.{i & 255}.1/24'
+
+def make_spec(name, positions, links, host_switches, link_bw=LINK_BW, link_delay=LINK_DELAY, host_bw=HOST_BW, host_delay=HOST_DELAY):
+  """
+  positions: {dpid: (x, y)}, links: [(dpid, dpid)], host_switches: [dpid] (un host per elemento)
+  """
+  hosts = []
+  for i, dpid in enumerate(host_switches):
+    x, y = positions[dpid]
+    # Gli host di uno stesso switch sono disposti a ventaglio sopra di lui
+    k = host_switches[:i].count(dpid)
+    hosts.append({
+      'name': f'h{i+1}', 'ip': host_ip(i), 'mac': host_mac(i), 'switch': dpid,
+      'pos': [x - SPACING/4 + k * SPACING/4, y - SPACING/2],
+      'bw': host_bw, 'delay': host_delay
+    })
+
+  return {
+    'name': name,
+    'switches': [{'dpid': dpid, 'pos': list(positions[dpid])} for dpid in sorted(positions)],
+    'hosts': hosts,
+    'links': [{'src': a, 'dst': b, 'bw': link_bw, 'delay': link_delay} for a, b in links]
+  }
+
+def spread(switches, count):
+  # count host distribuiti uniformemente sugli switch dati
+  return [switches[i * len(switches) // count] for i in range(count)] if count else []
+
+def grid(rows, cols, hosts=None, **params):
+  """
+  Griglia rows x cols, dpid per righe. Di default un host per switch d'angolo
+  """
+  def dpid(r, c):
+    return r*cols + c + 1
+
+  positions = {dpid(r, c): (SPACING * (c + 1), SPACING * (r + 1)) for r in range(rows) for c in range(cols)}
+  links = []
+  for r in range(rows):
+    for c in range(cols):
+      if c + 1 < cols: links.append((dpid(r, c), dpid(r, c + 1)))
+      if r + 1 < rows: links.append((dpid(r, c), dpid(r + 1, c)))
+
+  if hosts is None:
+    host_switches = sorted({dpid(0, 0), dpid(0, cols - 1), dpid(rows - 1, 0), dpid(rows - 1, cols - 1)})
+  else:
+    host_switches = spread(sorted(positions), hosts)
+  return make_spec(f'grid{rows}x{cols}', positions, links, host_switches, **params)
+
+def fat_tree(k, hosts_per_edge=None, **params):
+  """
+  Fat-tree k-ario: (k/2)^2 switch core, k pod con k/2 switch aggregation e k/2 edge,
+  hosts_per_edge host per switch edge (default k/2)
+  """
+  if k % 2: raise RuntimeError('Fat-tree: k deve essere pari')
+  half = k // 2
+  hosts_per_edge = half if hosts_per_edge is None else hosts_per_edge
+
+  positions = {}
+  links = []
+  next_dpid = iter(range(1, 5*k*k//4 + 1))
+  width = k * half
+
+  core = [next(next_dpid) for _ in range(half * half)]
+  for i, dpid in enumerate(core):
+    positions[dpid] = (SPACING * (1 + i * width / len(core)), SPACING)
+
+  edges = []
+  for pod in range(k):
+    aggregation = [next(next_dpid) for _ in range(half)]
+    edge = [next(next_dpid) for _ in range(half)]
+    for i, dpid in enumerate(aggregation):
+      positions[dpid] = (SPACING * (1 + pod * half + i), SPACING * 2)
+      # L'i-esimo switch aggregation del pod e' collegato agli switch core i*k/2 .. (i+1)*k/2 - 1
+      for j in range(half):
+        links.append((core[i * half + j], dpid))
+    for i, dpid in enumerate(edge):
+      positions[dpid] = (SPACING * (1 + pod * half + i), SPACING * 3)
+      for agg in aggregation:
+        links.append((agg, dpid))
+    edges.extend(edge)
+
+  host_switches = [dpid for dpid in edges for _ in range(hosts_per_edge)]
+  return make_spec(f'fat_tree{k}', positions, links, host_switches, **params)
+
+def random_graph(switches, degree=3, hosts=4, seed=0, **params):
+  """
+  Grafo geometrico casuale: switch in posizioni casuali, ognuno collegato ai `degree` piu' vicini;
+  le componenti rimaste separate vengono unite con il collegamento piu' corto
+  """
+  rng = random.Random(seed)
+  side = SPACING * math.sqrt(switches)
+  positions = {dpid: (round(rng.uniform(SPACING, side + SPACING), 2), round(rng.uniform(SPACING, side + SPACING), 2)) for dpid in range(1, switches + 1)}
+
+  def distance(a, b):
+    (xa, ya), (xb, yb) = positions[a], positions[b]
+    return math.hypot(xa - xb, ya - yb)
+
+  edges = set()
+  for a in positions:
+    nearest = sorted((b for b in positions if b != a), key=lambda b: distance(a, b))[:degree]
+    edges.update((min(a, b), max(a, b)) for b in nearest)
+
+  parent = {dpid: dpid for dpid in positions}
+  def find(x):
+    while parent[x] != x:
+      parent[x] = parent[parent[x]]
+      x = parent[x]
+    return x
+  for a, b in edges:
+    parent[find(a)] = find(b)
+
+  while len({find(dpid) for dpid in positions}) > 1:
+    root = find(1)
+    inside = [dpid for dpid in positions if find(dpid) == root]
+    outside = [dpid for dpid in positions if find(dpid) != root]
+    a, b = min(((a, b) for a in inside for b in outside), key=lambda pair: distance(*pair))
+    edges.add((min(a, b), max(a, b)))
+    parent[find(b)] = root
+
+  host_switches = spread(sorted(positions), hosts)
+  return make_spec(f'random{switches}', positions, sorted(edges), host_switches, **params)
+
+def save_topology(spec, path=TOPOLOGY_PATH):
+  with open(path, 'w') as file:
+    json.dump(spec, file, indent=2)
+
+def load_topology(path=TOPOLOGY_PATH):
+  """
+  Topologia salvata in path, oppure la griglia 3x3 di default se il file non esiste
+  """
+  if not os.path.exists(path):
+    return default_topology()
+  with open(path) as file:
+    return json.load(file)
+
+def switch_coords(spec):
+  return {switch['dpid']: tuple(switch['pos']) for switch in spec['switches']}
+
+def heuristic_coords(spec, min_cost):
+  """
+  Coordinate degli switch scalate in modo che la distanza di Manhattan tra gli estremi di ogni link
+  non superi min_cost (il costo minimo di un link): la distanza di Manhattan tra due switch resta
+  cosi' un limite inferiore del costo di qualunque percorso tra loro (euristica ammissibile per A*)
+  """
+  coords = switch_coords(spec)
+  longest = max((abs(coords[l['src']][0] - coords[l['dst']][0]) + abs(coords[l['src']][1] - coords[l['dst']][1]) for l in spec['links']), default=0)
+  scale = min_cost / longest if longest else 1
+  return {dpid: (x * scale, y * scale) for dpid, (x, y) in coords.items()}
+
+def plot_layout(spec):
+  """
+  Nodi e archi per print_graphs: host numerati da 1 nell'ordine della descrizione,
+  switch con dpid + numero di host (gli stessi id scritti dal controller nella telemetria)
+  """
+  offset = len(spec['hosts'])
+  nodes = {i + 1: tuple(host['pos']) for i, host in enumerate(spec['hosts'])}
+  nodes.update({switch['dpid'] + offset: tuple(switch['pos']) for switch in spec['switches']})
+  edges = {(i + 1, host['switch'] + offset) for i, host in enumerate(spec['hosts'])}
+  edges.update((link['src'] + offset, link['dst'] + offset) for link in spec['links'])
+  return nodes, edges
+
+if __name__ == '__main__':
+  # Opzioni comuni a tutti i tipi di topologia, da indicare dopo il tipo
+  common = argparse.ArgumentParser(add_help=False)
+  common.add_argument('--output', default=TOPOLOGY_PATH)
+  common.add_argument('--link-bw', type=float, default=LINK_BW)
+  common.add_argument('--link-delay', default=LINK_DELAY)
+  common.add_argument('--host-bw', type=float, default=HOST_BW)
+  common.add_argument('--host-delay', default=HOST_DELAY)
+
+  parser = argparse.ArgumentParser(description='Genera la descrizione della topologia')
+  kinds = parser.add_subparsers(dest='kind', required=True)
+
+  kinds.add_parser('default', parents=[common])
+  grid_parser = kinds.add_parser('grid', parents=[common])
+  grid_parser.add_argument('rows', type=int)
+  grid_parser.add_argument('cols', type=int)
+  grid_parser.add_argument('--hosts', type=int)
+  fat_tree_parser = kinds.add_parser('fat_tree', parents=[common])
+  fat_tree_parser.add_argument('k', type=int)
+  fat_tree_parser.add_argument('--hosts-per-edge', type=int)
+  random_parser = kinds.add_parser('random', parents=[common])
+  random_parser.add_argument('switches', type=int)
+  random_parser.add_argument('--degree', type=int, default=3)
+  random_parser.add_argument('--hosts', type=int, default=4)
+  random_parser.add_argument('--seed', type=int, default=0)
+
+  args = parser.parse_args()
+  params = {'link_bw': args.link_bw, 'link_delay': args.link_delay, 'host_bw': args.host_bw, 'host_delay': args.host_delay}
+  if args.kind == 'default':
+    spec = default_topology()
+  elif args.kind == 'grid':
+    spec = grid(args.rows, args.cols, hosts=args.hosts, **params)
+  elif args.kind == 'fat_tree':
+    spec = fat_tree(args.k, hosts_per_edge=args.hosts_per_edge, **params)
+  else:
+    spec = random_graph(args.switches, degree=args.degree, hosts=args.hosts, seed=args.seed, **params)
+
+  save_topology(spec, args.output)
+  print(f"{spec['name']}: {len(spec['switches'])} switch, {len(spec['links'])} link, {len(spec['hosts'])} host -> {args.output}")